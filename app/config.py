@@ -0,0 +1,16 @@
+"""
+Application configuration
+Environment is loaded once, when this module is first imported
+"""
+
+import os
+import certifi
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME")
+
+# CA bundle for TLS connections to MongoDB
+CA_FILE = certifi.where()
@@ -0,0 +1,21 @@
+"""
+Shared MongoDB connection
+One client (and connection pool) for the whole process
+"""
+
+from pymongo import MongoClient
+
+from app.config import CA_FILE, DB_NAME, MONGO_URI
+
+# Database connection (wire compression: zstd preferred, zlib for servers without it).
+# minPoolSize keeps connections warm so bursts don't wait on TLS handshakes.
+client = MongoClient(
+    MONGO_URI,
+    tlsCAFile=CA_FILE,
+    compressors="zstd,zlib",
+    zlibCompressionLevel=-1,
+    maxPoolSize=200,
+    minPoolSize=10,
+    retryWrites=True,
+)
+db = client[DB_NAME]
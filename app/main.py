@@ -1,29 +1,26 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+from pymongo.errors import PyMongoError
+import logging
 from app.routes import (
     api, auth, project, report, accounting, voucher, ledger, ocr,
     gmail_api, ledgers, outlook_api, dashboard, bank_transactions, billing, modelo
 )
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient
-import os
-import certifi
-from dotenv import load_dotenv
+from app.db import db
 
-# Load environment variables
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
-
-# Database connection
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
+logger = logging.getLogger(__name__)
 
 
 # Lifespan context manager for startup/shutdown events
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
+    # Open a pooled connection now so the first request doesn't pay for it
+    db.command("ping")
+    from app.repos.accounting_repo import backfill_account_lookup_keys
+    backfill_account_lookup_keys()
     from app.tasks.scheduled_billing import init_scheduled_tasks
     init_scheduled_tasks(db)
     print("✅ Scheduled billing tasks initialized")
@@ -38,7 +35,8 @@ app = FastAPI(
     title="Contia365 AI Invoice Automation API",
     description="Complete invoice automation with bank import and payment processing",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS settings
@@ -49,8 +47,17 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
+# Database failures that reach the app surface as a generic 500; the details
+# go to the log rather than to the client
+@app.exception_handler(PyMongoError)
+async def mongo_error_handler(request: Request, exc: PyMongoError):
+    logger.exception(f"Database error on {request.method} {request.url.path}", exc_info=exc)
+    return ORJSONResponse(status_code=500, content={"detail": "Database error"})
+
+
 # Include routes
 app.include_router(api.router, prefix="/api/api")
 app.include_router(auth.router, prefix="/api/auth")
@@ -274,6 +274,7 @@ class ReconciliationReport(BaseModel):
 
 class TransactionFilter(BaseModel):
     """Filter criteria for querying transactions"""
+    organization_id: Optional[str] = None
     bank_account_id: Optional[str] = None
     from_date: Optional[datetime] = None
     to_date: Optional[datetime] = None
@@ -299,3 +300,16 @@ class BankTransactionUpdate(BaseModel):
 class TransactionsToLedgerRequest(BaseModel):
     """Request to convert bank transactions to ledger entries"""
     transaction_ids: List[str] = Field(..., min_items=1, description="List of transaction IDs to convert to ledger entries")
+
+
+class ManualMatchRequest(BaseModel):
+    """Request to manually match a transaction to an invoice"""
+    invoice_id: str
+    voucher_id: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class MessageResponse(BaseModel):
+    """Simple acknowledgement response"""
+    message: str
+    id: Optional[str] = None
@@ -1,13 +1,11 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from decimal import Decimal
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING, UpdateOne
 from pymongo.collection import Collection
 from bson import ObjectId
-import certifi
-import os
-from dotenv import load_dotenv
 
+from app.db import client, db
 from app.models.accounting import (
     Account, AccountCreate, AccountUpdate,
     Journal, JournalCreate,
@@ -18,14 +16,47 @@ from app.models.accounting import (
     AccountType
 )
 
-load_dotenv()
+
+def account_lookup_keys(account_code: Optional[str] = None,
+                        account_name: Optional[str] = None) -> Dict[str, str]:
+    """Uppercased copies of account code/name used for indexed equality lookups"""
+    keys = {}
+    if account_code is not None:
+        keys["account_code_upper"] = account_code.upper()
+    if account_name is not None:
+        keys["account_name_upper"] = account_name.upper()
+    return keys
+
+
+def backfill_account_lookup_keys():
+    """
+    Bring account lookup keys in line with account_lookup_keys(); run once at startup
+
+    Keys are computed with str.upper() so non-ASCII names match what lookups
+    compute (Mongo's $toUpper only folds ASCII). This also repairs keys an
+    earlier $toUpper backfill wrote.
+    """
+    accounts = db["accounts"]
+    ops = []
+    for doc in accounts.find(
+        {},
+        {"account_code": 1, "account_name": 1, "account_code_upper": 1, "account_name_upper": 1}
+    ):
+        keys = account_lookup_keys(doc.get("account_code"), doc.get("account_name"))
+        if any(doc.get(field) != value for field, value in keys.items()):
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": keys}))
+        if len(ops) == 1000:
+            accounts.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        accounts.bulk_write(ops, ordered=False)
+
 
 class AccountingRepository:
     def __init__(self):
-        self.mongo_uri = os.getenv("MONGO_URI")
-        self.db_name = os.getenv("DB_NAME")
-        self.client = MongoClient(self.mongo_uri, tlsCAFile=certifi.where())
-        self.db = self.client[self.db_name]
+        # Reuse the process-wide client instead of opening a pool per instance
+        self.client = client
+        self.db = db
         
         # Collections
         self.accounts: Collection = self.db["accounts"]
@@ -44,6 +75,8 @@ class AccountingRepository:
         self.accounts.create_index([("organization_id", ASCENDING), ("account_code", ASCENDING)], unique=True)
         self.accounts.create_index([("organization_id", ASCENDING), ("account_type", ASCENDING)])
         self.accounts.create_index([("organization_id", ASCENDING), ("is_active", ASCENDING)])
+        self.accounts.create_index([("organization_id", ASCENDING), ("account_code_upper", ASCENDING)])
+        self.accounts.create_index([("organization_id", ASCENDING), ("account_name_upper", ASCENDING)])
         
         # Journals indexes
         self.journals.create_index([("organization_id", ASCENDING), ("journal_code", ASCENDING)], unique=True)
@@ -116,6 +149,8 @@ class AccountingRepository:
         account_dict["organization_id"] = organization_id
         account_dict["created_at"] = datetime.utcnow()
         account_dict["updated_at"] = datetime.utcnow()
+        account_dict.update(account_lookup_keys(account_dict.get("account_code"),
+                                                account_dict.get("account_name")))
         
         # Convert Decimal values to float for MongoDB compatibility
         account_dict = self._convert_decimals_to_float(account_dict)
@@ -157,6 +192,8 @@ class AccountingRepository:
         """Update account"""
         update_dict = {k: v for k, v in account_data.dict().items() if v is not None}
         update_dict["updated_at"] = datetime.utcnow()
+        update_dict.update(account_lookup_keys(update_dict.get("account_code"),
+                                               update_dict.get("account_name")))
         
         # Convert Decimal values to float for MongoDB compatibility
         update_dict = self._convert_decimals_to_float(update_dict)
@@ -4,8 +4,8 @@ MongoDB data access layer for bank accounts, statements, and transactions
 """
 
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from typing import List, Optional, Dict, Any, Tuple
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne
 from pymongo.collection import Collection
 from bson import ObjectId
 import logging
@@ -16,13 +16,45 @@ from app.models.bank_transactions import (
     BankTransaction,
     PaymentInvoiceMatch,
     ReconciliationReport,
-    TransactionFilter,
     TransactionStatus,
     MatchStatus,
 )
 
 logger = logging.getLogger(__name__)
 
+# Max documents per insert_many/bulk_write call
+BULK_INSERT_BATCH_SIZE = 1000
+
+# How long background matching job records are kept
+MATCHING_JOB_TTL_SECONDS = 7 * 24 * 3600
+
+# Index serving per-account transaction lists; also used as a query hint
+TRANSACTION_ACCOUNT_DATE_INDEX = [
+    ("organization_id", ASCENDING),
+    ("bank_account_id", ASCENDING),
+    ("transaction_date", DESCENDING),
+    ("_id", DESCENDING),
+]
+
+# Fields returned by transaction list queries (omits raw_data and audit fields)
+TRANSACTION_LIST_PROJECTION = {
+    "_id": 1,
+    "organization_id": 1,
+    "bank_account_id": 1,
+    "transaction_date": 1,
+    "value_date": 1,
+    "transaction_type": 1,
+    "amount": 1,
+    "currency": 1,
+    "reference": 1,
+    "description": 1,
+    "counterparty_name": 1,
+    "status": 1,
+    "match_status": 1,
+    "matched_invoice_id": 1,
+    "ledger_entry_id": 1,
+}
+
 
 class BankRepository:
     """Repository for bank-related data operations"""
@@ -34,6 +66,7 @@ class BankRepository:
         self.bank_transactions: Collection = db["bank_transactions"]
         self.payment_matches: Collection = db["payment_invoice_matches"]
         self.reconciliation_reports: Collection = db["reconciliation_reports"]
+        self.matching_jobs: Collection = db["bank_matching_jobs"]
 
         # Create indexes
         self._create_indexes()
@@ -65,6 +98,33 @@ class BankRepository:
             self.bank_transactions.create_index([("status", ASCENDING)])
             self.bank_transactions.create_index([("match_status", ASCENDING)])
             self.bank_transactions.create_index([("transaction_type", ASCENDING)])
+            # Compound indexes matching the transaction list filter shapes:
+            # equality fields first, then the (transaction_date, _id) sort
+            self.bank_transactions.create_index(TRANSACTION_ACCOUNT_DATE_INDEX)
+            self.bank_transactions.create_index(
+                [
+                    ("organization_id", ASCENDING),
+                    ("status", ASCENDING),
+                    ("match_status", ASCENDING),
+                    ("transaction_date", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            )
+            self.bank_transactions.create_index(
+                [
+                    ("organization_id", ASCENDING),
+                    ("match_status", ASCENDING),
+                    ("transaction_date", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            )
+            self.bank_transactions.create_index(
+                [
+                    ("organization_id", ASCENDING),
+                    ("transaction_date", DESCENDING),
+                    ("_id", DESCENDING),
+                ]
+            )
 
             # Payment matches
             self.payment_matches.create_index([("organization_id", ASCENDING)])
@@ -72,6 +132,12 @@ class BankRepository:
             self.payment_matches.create_index([("invoice_id", ASCENDING)])
             self.payment_matches.create_index([("match_status", ASCENDING)])
 
+            # Background matching jobs (kept for a week)
+            self.matching_jobs.create_index([("job_id", ASCENDING)], unique=True)
+            self.matching_jobs.create_index(
+                [("created_at", ASCENDING)], expireAfterSeconds=MATCHING_JOB_TTL_SECONDS
+            )
+
             logger.info("Bank repository indexes created successfully")
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
@@ -94,15 +160,37 @@ class BankRepository:
         docs = self.bank_accounts.find({"organization_id": organization_id})
         return [BankAccount(**doc) for doc in docs]
 
+    def get_bank_account_docs_by_org(self, organization_id: str) -> List[Dict[str, Any]]:
+        """Get all bank accounts for an organization as raw documents"""
+        docs = list(self.bank_accounts.find({"organization_id": organization_id}))
+        for doc in docs:
+            doc["_id"] = str(doc["_id"])
+        return docs
+
+    def bank_account_belongs_to_org(self, account_id: str, organization_id: str) -> bool:
+        """Check account ownership without fetching the account document"""
+        return self.bank_accounts.count_documents(
+            {"_id": ObjectId(account_id), "organization_id": organization_id}, limit=1
+        ) > 0
+
     def update_bank_account_balance(
-        self, account_id: str, new_balance: float
+        self, account_id: str, new_balance: float, organization_id: Optional[str] = None
     ) -> bool:
-        """Update bank account current balance"""
+        """
+        Update bank account current balance
+
+        When organization_id is given the update only applies to an account
+        owned by that organization. Returns True if the account was found.
+        """
+        query = {"_id": ObjectId(account_id)}
+        if organization_id:
+            query["organization_id"] = organization_id
+
         result = self.bank_accounts.update_one(
-            {"_id": ObjectId(account_id)},
+            query,
             {"$set": {"current_balance": new_balance, "updated_at": datetime.utcnow()}},
         )
-        return result.modified_count > 0
+        return result.matched_count > 0
 
     def deactivate_bank_account(self, account_id: str) -> bool:
         """Deactivate a bank account"""
@@ -163,20 +251,50 @@ class BankRepository:
         result = self.bank_transactions.insert_one(trans_dict)
         return str(result.inserted_id)
 
-    def create_transactions_bulk(self, transactions: List[BankTransaction]) -> List[str]:
-        """Bulk insert bank transactions"""
+    def create_transactions_bulk(
+        self, transactions: List[BankTransaction], statement_id: Optional[str] = None
+    ) -> List[str]:
+        """
+        Bulk insert bank transactions
+
+        Documents are sorted by transaction_date so index inserts stay mostly
+        sequential, and written unordered in batches that stay well below the
+        16MB command limit. When statement_id is given it is stamped onto each
+        document as it is built.
+        """
         if not transactions:
             return []
 
-        trans_dicts = [t.dict(by_alias=True, exclude={"id"}) for t in transactions]
-        result = self.bank_transactions.insert_many(trans_dicts)
-        return [str(id) for id in result.inserted_ids]
+        trans_dicts = sorted(
+            (t.dict(by_alias=True, exclude={"id"}) for t in transactions),
+            key=lambda d: d["transaction_date"],
+        )
+        if statement_id is not None:
+            for d in trans_dicts:
+                d["statement_id"] = statement_id
+
+        inserted_ids = []
+        for start in range(0, len(trans_dicts), BULK_INSERT_BATCH_SIZE):
+            batch = trans_dicts[start:start + BULK_INSERT_BATCH_SIZE]
+            result = self.bank_transactions.insert_many(batch, ordered=False)
+            inserted_ids.extend(str(id) for id in result.inserted_ids)
+        return inserted_ids
 
     def get_transaction(self, transaction_id: str) -> Optional[BankTransaction]:
         """Get bank transaction by ID"""
         doc = self.bank_transactions.find_one({"_id": ObjectId(transaction_id)})
         return BankTransaction(**doc) if doc else None
 
+    def get_transactions_by_ids(
+        self, transaction_ids: List[ObjectId]
+    ) -> Dict[str, BankTransaction]:
+        """Get bank transactions by ID in a single query, keyed by string ID"""
+        if not transaction_ids:
+            return {}
+
+        docs = self.bank_transactions.find({"_id": {"$in": transaction_ids}})
+        return {str(doc["_id"]): BankTransaction(**doc) for doc in docs}
+
     def get_transactions_by_statement(self, statement_id: str) -> List[BankTransaction]:
         """Get all transactions for a statement"""
         docs = self.bank_transactions.find({"statement_id": statement_id}).sort(
@@ -185,73 +303,236 @@ class BankRepository:
         return [BankTransaction(**doc) for doc in docs]
 
     def query_transactions(
-        self, filters: TransactionFilter, skip: int = 0, limit: int = 100
-    ) -> List[BankTransaction]:
-        """Query transactions with filters"""
+        self,
+        filters: Dict[str, Any],
+        limit: int = 100,
+        after_date: Optional[datetime] = None,
+        after_id: Optional[str] = None,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> List[Any]:
+        """
+        Query transactions with filters
+
+        filters is a plain dict keyed by TransactionFilter field names; keys
+        that are missing or None are ignored.
+
+        Results are ordered by (transaction_date, _id) descending. Pages are
+        keyset-paginated: pass the transaction_date/_id of the last row of
+        the previous page as after_date/after_id to fetch the next one.
+
+        When a projection is given, raw documents (with string _id) are
+        returned instead of BankTransaction models.
+        """
+        query = self._build_transaction_query(filters)
+
+        if after_date is not None:
+            keyset = [{"transaction_date": {"$lt": after_date}}]
+            if after_id:
+                keyset.append(
+                    {"transaction_date": after_date, "_id": {"$lt": ObjectId(after_id)}}
+                )
+            query["$or"] = keyset
+
+        cursor = (
+            self.bank_transactions.find(query, projection)
+            .sort([("transaction_date", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit)
+        )
+        hint = self._transaction_query_hint(filters)
+        if hint:
+            cursor = cursor.hint(hint)
+
+        if projection:
+            docs = list(cursor)
+            for doc in docs:
+                doc["_id"] = str(doc["_id"])
+            return docs
+
+        return [BankTransaction(**doc) for doc in cursor]
+
+    def query_transactions_paged(
+        self,
+        filters: Dict[str, Any],
+        limit: int = 100,
+        projection: Optional[Dict[str, int]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Fetch the first page of matching transactions together with the total
+        number of matches, in a single $facet aggregation
+
+        Returns (raw documents with string _id, total count).
+        """
+        data_stage: List[Dict[str, Any]] = [{"$limit": limit}]
+        if projection:
+            data_stage.append({"$project": projection})
+
+        pipeline = [
+            {"$match": self._build_transaction_query(filters)},
+            {"$sort": {"transaction_date": DESCENDING, "_id": DESCENDING}},
+            {
+                "$facet": {
+                    "data": data_stage,
+                    "total": [{"$count": "n"}],
+                }
+            },
+        ]
+
+        hint = self._transaction_query_hint(filters)
+        aggregate_options = {"hint": hint} if hint else {}
+        result = next(self.bank_transactions.aggregate(pipeline, **aggregate_options), None) or {}
+        docs = result.get("data", [])
+        for doc in docs:
+            doc["_id"] = str(doc["_id"])
+
+        total = result.get("total") or [{"n": 0}]
+        return docs, total[0]["n"]
+
+    @staticmethod
+    def _transaction_query_hint(filters: Dict[str, Any]) -> Optional[List[Tuple[str, int]]]:
+        """
+        Pick the index for the most common list shape (one account of one
+        organization), where the planner otherwise may race the single-field
+        indexes against it
+        """
+        if filters.get("organization_id") and filters.get("bank_account_id"):
+            return TRANSACTION_ACCOUNT_DATE_INDEX
+        return None
+
+    @staticmethod
+    def _build_transaction_query(filters: Dict[str, Any]) -> Dict[str, Any]:
+        """Translate list filters (TransactionFilter field names) into a Mongo query"""
         query = {}
 
-        if filters.bank_account_id:
-            query["bank_account_id"] = filters.bank_account_id
+        if filters.get("organization_id"):
+            query["organization_id"] = filters.get("organization_id")
 
-        if filters.from_date:
-            query.setdefault("transaction_date", {})["$gte"] = filters.from_date
+        if filters.get("bank_account_id"):
+            query["bank_account_id"] = filters.get("bank_account_id")
 
-        if filters.to_date:
-            query.setdefault("transaction_date", {})["$lte"] = filters.to_date
+        if filters.get("from_date"):
+            query.setdefault("transaction_date", {})["$gte"] = filters.get("from_date")
 
-        if filters.transaction_type:
-            query["transaction_type"] = filters.transaction_type
+        if filters.get("to_date"):
+            query.setdefault("transaction_date", {})["$lte"] = filters.get("to_date")
 
-        if filters.status:
-            query["status"] = filters.status
+        if filters.get("transaction_type"):
+            query["transaction_type"] = filters.get("transaction_type")
 
-        if filters.match_status:
-            query["match_status"] = filters.match_status
+        if filters.get("status"):
+            query["status"] = filters.get("status")
 
-        if filters.min_amount is not None:
-            query.setdefault("amount", {})["$gte"] = filters.min_amount
+        if filters.get("match_status"):
+            query["match_status"] = filters.get("match_status")
 
-        if filters.max_amount is not None:
-            query.setdefault("amount", {})["$lte"] = filters.max_amount
+        if filters.get("min_amount") is not None:
+            query.setdefault("amount", {})["$gte"] = filters.get("min_amount")
 
-        if filters.counterparty_name:
-            query["counterparty_name"] = {"$regex": filters.counterparty_name, "$options": "i"}
+        if filters.get("max_amount") is not None:
+            query.setdefault("amount", {})["$lte"] = filters.get("max_amount")
 
-        if filters.reference:
-            query["reference"] = {"$regex": filters.reference, "$options": "i"}
+        if filters.get("counterparty_name"):
+            query["counterparty_name"] = {"$regex": filters.get("counterparty_name"), "$options": "i"}
 
-        docs = (
-            self.bank_transactions.find(query)
-            .sort("transaction_date", DESCENDING)
-            .skip(skip)
-            .limit(limit)
-        )
+        if filters.get("reference"):
+            query["reference"] = {"$regex": filters.get("reference"), "$options": "i"}
 
-        return [BankTransaction(**doc) for doc in docs]
+        return query
 
     def update_transaction_status(
         self,
         transaction_id: str,
-        status: TransactionStatus,
+        status: Optional[TransactionStatus],
         match_status: Optional[MatchStatus] = None,
+        organization_id: Optional[str] = None,
     ) -> bool:
-        """Update transaction status"""
-        update_data = {"status": status, "updated_at": datetime.utcnow()}
+        """
+        Update transaction status
+
+        When organization_id is given the update only applies to a transaction
+        owned by that organization. Returns True if the transaction was found.
+        """
+        update_data = {"updated_at": datetime.utcnow()}
+
+        if status:
+            update_data["status"] = status
 
         if match_status:
             update_data["match_status"] = match_status
 
-        result = self.bank_transactions.update_one(
-            {"_id": ObjectId(transaction_id)}, {"$set": update_data}
-        )
-        return result.modified_count > 0
+        query = {"_id": ObjectId(transaction_id)}
+        if organization_id:
+            query["organization_id"] = organization_id
+
+        result = self.bank_transactions.update_one(query, {"$set": update_data})
+        return result.matched_count > 0
+
+    @staticmethod
+    def _invoice_match_update(
+        invoice_id: str, voucher_id: Optional[str], now: datetime
+    ) -> Dict[str, Any]:
+        """$set payload for an automatically matched transaction"""
+        update_data = {
+            "match_status": MatchStatus.AUTO_MATCHED,
+            "matched_invoice_id": invoice_id,
+            "status": TransactionStatus.MATCHED,
+            "updated_at": now,
+        }
+
+        if voucher_id:
+            update_data["matched_voucher_id"] = voucher_id
+
+        return update_data
 
     def match_transaction_to_invoice(
         self, transaction_id: str, invoice_id: str, voucher_id: Optional[str] = None
     ) -> bool:
         """Match transaction to invoice/voucher"""
+        update_data = self._invoice_match_update(invoice_id, voucher_id, datetime.utcnow())
+
+        result = self.bank_transactions.update_one(
+            {"_id": ObjectId(transaction_id)}, {"$set": update_data}
+        )
+        return result.modified_count > 0
+
+    def match_transactions_to_invoices_bulk(
+        self, matches: List[Dict[str, Optional[str]]]
+    ) -> int:
+        """
+        Match many transactions to invoices/vouchers with unordered bulk writes
+
+        Each item carries transaction_id, invoice_id and optional voucher_id.
+        Returns the number of transactions modified.
+        """
+        if not matches:
+            return 0
+
+        now = datetime.utcnow()
+        ops = [
+            UpdateOne(
+                {"_id": ObjectId(m["transaction_id"])},
+                {"$set": self._invoice_match_update(m["invoice_id"], m.get("voucher_id"), now)},
+            )
+            for m in matches
+        ]
+
+        modified = 0
+        for start in range(0, len(ops), BULK_INSERT_BATCH_SIZE):
+            result = self.bank_transactions.bulk_write(
+                ops[start:start + BULK_INSERT_BATCH_SIZE], ordered=False
+            )
+            modified += result.modified_count
+        return modified
+
+    def manual_match_transaction(
+        self,
+        transaction_id: str,
+        organization_id: str,
+        invoice_id: str,
+        voucher_id: Optional[str] = None,
+    ) -> Optional[BankTransaction]:
+        """Mark an organization's transaction as manually matched and return it"""
         update_data = {
-            "match_status": MatchStatus.AUTO_MATCHED,
+            "match_status": MatchStatus.MANUAL_MATCHED,
             "matched_invoice_id": invoice_id,
             "status": TransactionStatus.MATCHED,
             "updated_at": datetime.utcnow(),
@@ -260,10 +541,12 @@ class BankRepository:
         if voucher_id:
             update_data["matched_voucher_id"] = voucher_id
 
-        result = self.bank_transactions.update_one(
-            {"_id": ObjectId(transaction_id)}, {"$set": update_data}
+        doc = self.bank_transactions.find_one_and_update(
+            {"_id": ObjectId(transaction_id), "organization_id": organization_id},
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER,
         )
-        return result.modified_count > 0
+        return BankTransaction(**doc) if doc else None
 
     def get_unmatched_transactions(
         self, organization_id: str, limit: int = 100
@@ -290,6 +573,19 @@ class BankRepository:
         result = self.payment_matches.insert_one(match_dict)
         return str(result.inserted_id)
 
+    def create_payment_matches_bulk(self, matches: List[PaymentInvoiceMatch]) -> List[str]:
+        """Bulk insert payment-invoice match records"""
+        if not matches:
+            return []
+
+        match_dicts = [m.dict(by_alias=True, exclude={"id"}) for m in matches]
+        inserted_ids = []
+        for start in range(0, len(match_dicts), BULK_INSERT_BATCH_SIZE):
+            batch = match_dicts[start:start + BULK_INSERT_BATCH_SIZE]
+            result = self.payment_matches.insert_many(batch, ordered=False)
+            inserted_ids.extend(str(id) for id in result.inserted_ids)
+        return inserted_ids
+
     def get_matches_by_transaction(
         self, transaction_id: str
     ) -> List[PaymentInvoiceMatch]:
@@ -302,6 +598,47 @@ class BankRepository:
         docs = self.payment_matches.find({"invoice_id": invoice_id})
         return [PaymentInvoiceMatch(**doc) for doc in docs]
 
+    # ===== Matching Jobs =====
+
+    def create_matching_job(self, job_id: str, organization_id: str) -> None:
+        """Record a queued background matching job"""
+        now = datetime.utcnow()
+        self.matching_jobs.insert_one({
+            "job_id": job_id,
+            "organization_id": organization_id,
+            "status": "queued",
+            "stats": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    def update_matching_job(
+        self,
+        job_id: str,
+        status: str,
+        stats: Optional[Dict[str, int]] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """Update a background matching job's status and result"""
+        self.matching_jobs.update_one(
+            {"job_id": job_id},
+            {"$set": {
+                "status": status,
+                "stats": stats,
+                "error": error,
+                "updated_at": datetime.utcnow(),
+            }},
+        )
+
+    def get_matching_job(
+        self, job_id: str, organization_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Get an organization's background matching job"""
+        return self.matching_jobs.find_one(
+            {"job_id": job_id, "organization_id": organization_id}, {"_id": 0}
+        )
+
     # ===== Reconciliation =====
 
     def create_reconciliation_report(self, report: ReconciliationReport) -> str:
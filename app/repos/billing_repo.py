@@ -8,7 +8,9 @@ from typing import List, Optional, Dict, Any
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.collection import Collection
 from bson import ObjectId
+from cachetools import TTLCache
 import logging
+import threading
 
 from app.models.billing import (
     SubscriptionPlan,
@@ -26,6 +28,9 @@ from app.models.billing import (
 
 logger = logging.getLogger(__name__)
 
+# Subscription plans change rarely, so reads are cached in-process briefly
+PLAN_CACHE_TTL_SECONDS = 60
+
 
 class BillingRepository:
     """Repository for billing-related data operations"""
@@ -41,6 +46,10 @@ class BillingRepository:
         self.webhook_events: Collection = db["webhook_events"]
         self.billing_invoices: Collection = db["billing_invoices"]
 
+        # Plan reads are served from a short-lived cache
+        self._plan_cache = TTLCache(maxsize=128, ttl=PLAN_CACHE_TTL_SECONDS)
+        self._plan_cache_lock = threading.Lock()
+
         # Create indexes
         self._create_indexes()
 
@@ -95,17 +104,43 @@ class BillingRepository:
         """Create subscription plan"""
         plan_dict = plan.dict(by_alias=True, exclude={"id"})
         result = self.subscription_plans.insert_one(plan_dict)
+        self.clear_plan_cache()
         return str(result.inserted_id)
 
     def get_plan(self, plan_id: str) -> Optional[SubscriptionPlan]:
-        """Get subscription plan by ID"""
+        """Get subscription plan by ID (cached for PLAN_CACHE_TTL_SECONDS)"""
+        key = ("plan", plan_id)
+        with self._plan_cache_lock:
+            plan = self._plan_cache.get(key)
+        if plan is not None:
+            return plan
+
         doc = self.subscription_plans.find_one({"_id": ObjectId(plan_id)})
-        return SubscriptionPlan(**doc) if doc else None
+        if not doc:
+            return None
+
+        plan = SubscriptionPlan(**doc)
+        with self._plan_cache_lock:
+            self._plan_cache[key] = plan
+        return plan
 
     def get_active_plans(self) -> List[SubscriptionPlan]:
-        """Get all active subscription plans"""
+        """Get all active subscription plans (cached for PLAN_CACHE_TTL_SECONDS)"""
+        with self._plan_cache_lock:
+            plans = self._plan_cache.get("active_plans")
+        if plans is not None:
+            return plans
+
         docs = self.subscription_plans.find({"is_active": True, "is_public": True})
-        return [SubscriptionPlan(**doc) for doc in docs]
+        plans = [SubscriptionPlan(**doc) for doc in docs]
+        with self._plan_cache_lock:
+            self._plan_cache["active_plans"] = plans
+        return plans
+
+    def clear_plan_cache(self) -> None:
+        """Drop cached plans so the next read goes to the database"""
+        with self._plan_cache_lock:
+            self._plan_cache.clear()
 
     # ===== Subscriptions =====
 
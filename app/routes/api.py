@@ -13,13 +13,10 @@ import xml.etree.ElementTree as ET
 from openai import OpenAI
 import bcrypt
 from datetime import datetime, timedelta
-import certifi
 from app.routes.auth import get_current_user
 from fastapi import FastAPI, HTTPException
 from pymongo import MongoClient
 from fastapi.security import OAuth2PasswordBearer
-import certifi
-from dotenv import load_dotenv
 from pydantic import BaseModel, EmailStr
 from fastapi import APIRouter, File, UploadFile, Depends, Form, HTTPException
 from bson import ObjectId
@@ -44,13 +41,11 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.text import MIMEText
 
-load_dotenv()
+from app.config import CA_FILE, DB_NAME, MONGO_URI
 # Set Tesseract path (Windows)
 AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
 s3 = boto3.client(
     "s3",
     aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
@@ -62,7 +57,7 @@ bucket_name = "ai-auto-invoice"
 
 
 
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 projects_collection = db["projects"]
 ocr_collection = db["ocr"]  # Replace 'db' with your actual DB object
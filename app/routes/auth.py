@@ -7,9 +7,7 @@ from datetime import datetime, timedelta
 from enum import Enum
 from typing import Optional, List
 import bcrypt
-import certifi
 from jose import JWTError, jwt
-from dotenv import load_dotenv
 from fastapi.security import OAuth2PasswordBearer
 from typing import List, Optional
 from pydantic import BaseModel, EmailStr
@@ -20,21 +18,23 @@ from fastapi.responses import RedirectResponse, JSONResponse
 from google_auth_oauthlib.flow import Flow
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
+from app.models.billing import SubscriptionStatus
 
 # -------------------- Load Environment Variables --------------------
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+from app.config import CA_FILE, DB_NAME, MONGO_URI
 SECRET_KEY = os.getenv("SECRET_KEY", "ikingkhs23a")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "600"))
+# How long a token's subscription claim can skip the subscription lookup
+SUBSCRIPTION_CLAIM_TTL_MINUTES = int(os.getenv("SUBSCRIPTION_CLAIM_TTL_MINUTES", "15"))
 
 # -------------------- Database Connection --------------------
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 users_collection = db["users"]
 oauth_states_collection = db["oauth_states"]
 org_types_collection = db["org_types"]
+subscriptions_collection = db["subscriptions"]
 
 # -------------------- Router --------------------
 router = APIRouter()
@@ -120,6 +120,38 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+def subscription_claims(user_id: str) -> dict:
+    """
+    Claims letting /billing/check-access answer without a subscription lookup
+
+    sub_access_until is capped at SUBSCRIPTION_CLAIM_TTL_MINUTES so a
+    suspension or cancellation is picked up within that window.
+    """
+    subscription = subscriptions_collection.find_one(
+        {
+            "user_id": user_id,
+            "status": {"$in": [
+                SubscriptionStatus.ACTIVE,
+                SubscriptionStatus.TRIALING,
+                SubscriptionStatus.PAST_DUE,
+            ]},
+            "is_suspended": {"$ne": True},
+        },
+        {"status": 1, "current_period_end": 1},
+    )
+    if not subscription:
+        return {}
+
+    access_until = datetime.utcnow() + timedelta(minutes=SUBSCRIPTION_CLAIM_TTL_MINUTES)
+    period_end = subscription.get("current_period_end")
+    if period_end and period_end < access_until:
+        access_until = period_end
+
+    return {
+        "sub_access_until": access_until.isoformat(),
+        "sub_status": subscription["status"],
+    }
+
 # -------------------- Add Organization Type --------------------
 @router.post("/org-types", response_model=dict)
 def add_org_type(type_data: OrgTypeCreate):
@@ -312,7 +344,7 @@ def login(user: UserLogin):
     db_user.pop("password_hash", None)
 
     access_token = create_access_token(
-        {"sub": str(db_user["_id"])},
+        {"sub": str(db_user["_id"]), **subscription_claims(db_user["_id"])},
         timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -340,6 +372,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
     user = users_collection.find_one({"_id": ObjectId(user_id)})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+
+    # Normalize ids once so routes can use them directly as strings
+    user["_id"] = str(user["_id"])
+    user["organization_id"] = str(user.get("organization_id") or user["_id"])
+    user["sub_access_until"] = payload.get("sub_access_until")
     return user
 
 # Example protected route
@@ -348,7 +385,7 @@ def dashboard(current_user: dict = Depends(get_current_user)):
     return {
         "message": f"Welcome {current_user['name']}!",
         "email": current_user["email"],
-        "id": str(current_user["_id"])  # Convert ObjectId to string
+        "id": current_user["_id"]
     }
 
 
@@ -497,7 +534,7 @@ def google_callback(code: str, state: str):
 
         # Issue app JWT
         access_token = create_access_token(
-            {"sub": user_id_str},
+            {"sub": user_id_str, **subscription_claims(user_id_str)},
             timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         )
         return {
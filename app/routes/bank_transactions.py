@@ -2,96 +2,126 @@
 Bank Transaction API Routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from typing import Optional
+from functools import lru_cache
 from datetime import datetime
-from pymongo import MongoClient
+import base64
+import hashlib
+import logging
+import uuid
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson import ObjectId
-import os
-import certifi
-from dotenv import load_dotenv
+from bson.errors import InvalidId
 
 from app.models.bank_transactions import (
     BankAccount,
     BankAccountCreate,
     BankStatement,
     BankTransaction,
-    TransactionFilter,
     BankStatementFormat,
     BankTransactionUpdate,
     TransactionsToLedgerRequest,
+    ManualMatchRequest,
+    MessageResponse,
 )
-from app.repos.bank_repo import BankRepository
-from app.repos.accounting_repo import AccountingRepository
+from app.repos.bank_repo import BankRepository, TRANSACTION_LIST_PROJECTION
+from app.repos.accounting_repo import AccountingRepository, account_lookup_keys
 from app.services.bank_parser import BankStatementParser
 from app.services.payment_matching_service import PaymentMatchingService
 from app.routes.auth import get_current_user
+from app.db import db
 
-# Load environment
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+router = APIRouter(tags=["Bank Transactions"])
 
-# Database connection
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
+# Statement uploads are read in 1MB chunks
+UPLOAD_CHUNK_SIZE = 1 << 20
 
-router = APIRouter(tags=["Bank Transactions"])
+logger = logging.getLogger(__name__)
+
+
+# ===== Dependencies =====
+# Repositories and services are built once per process and shared by every
+# request instead of being re-created (and re-ensuring indexes) per call.
+
+@lru_cache(maxsize=1)
+def get_bank_repo() -> BankRepository:
+    return BankRepository(db)
+
+
+@lru_cache(maxsize=1)
+def get_accounting_repo() -> AccountingRepository:
+    return AccountingRepository()
+
+
+@lru_cache(maxsize=1)
+def get_matching_service() -> PaymentMatchingService:
+    return PaymentMatchingService(get_bank_repo(), get_accounting_repo())
+
+
+def _run_auto_matching(
+    matching_service: PaymentMatchingService, organization_id: str, job_id: str
+):
+    """Background job: match all unmatched transactions for an organization"""
+    bank_repo = matching_service.bank_repo
+    try:
+        bank_repo.update_matching_job(job_id, "running")
+        stats = matching_service.match_all_unmatched_transactions(organization_id)
+        bank_repo.update_matching_job(job_id, "completed", stats=stats)
+        logger.info(f"Auto-matching job {job_id} completed: {stats}")
+    except Exception as e:
+        bank_repo.update_matching_job(job_id, "failed", error=str(e))
+        logger.error(f"Auto-matching job {job_id} failed: {e}")
 
 
 # ===== Bank Account Management =====
 
-@router.post("/bank/accounts", response_model=dict)
+@router.post("/bank/accounts", response_model=MessageResponse)
 async def create_bank_account(
     account: BankAccountCreate,
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Create a new bank account"""
-    bank_repo = BankRepository(db)
-
-    # Convert ObjectId to string
-    org_id = current_user.get("organization_id") or current_user["_id"]
-    if not isinstance(org_id, str):
-        org_id = str(org_id)
-
     bank_account = BankAccount(
-        organization_id=org_id,
+        organization_id=current_user["organization_id"],
         **account.dict(),
     )
 
-    account_id = bank_repo.create_bank_account(bank_account)
+    account_id = await run_in_threadpool(bank_repo.create_bank_account, bank_account)
 
     return {"id": account_id, "message": "Bank account created successfully"}
 
 
-@router.get("/bank/accounts", response_model=List[dict])
+@router.get("/bank/accounts", response_model=None)
 async def list_bank_accounts(
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get all bank accounts for organization"""
-    bank_repo = BankRepository(db)
-    organization_id = current_user.get("organization_id") or current_user["_id"]
-    organization_id = str(organization_id) if not isinstance(organization_id, str) else organization_id
-    accounts = bank_repo.get_bank_accounts_by_org(organization_id)
-    return [acc.dict(by_alias=True) for acc in accounts]
+    accounts = await run_in_threadpool(
+        bank_repo.get_bank_account_docs_by_org, current_user["organization_id"]
+    )
+    return ORJSONResponse(accounts)
 
 
 @router.get("/bank/accounts/{account_id}", response_model=dict)
 async def get_bank_account(
     account_id: str,
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get bank account details"""
-    bank_repo = BankRepository(db)
-    account = bank_repo.get_bank_account(account_id)
+    account = await run_in_threadpool(bank_repo.get_bank_account, account_id)
 
     if not account:
         raise HTTPException(status_code=404, detail="Bank account not found")
 
     # Verify ownership
-    user_org_id = current_user.get("organization_id") or current_user["_id"]
-    user_org_id = str(user_org_id) if not isinstance(user_org_id, str) else user_org_id
-    if account.organization_id != user_org_id:
+    if account.organization_id != current_user["organization_id"]:
         raise HTTPException(status_code=403, detail="Access denied")
 
     return account.dict(by_alias=True)
@@ -101,9 +131,12 @@ async def get_bank_account(
 
 @router.post("/bank/import", response_model=dict)
 async def import_bank_statement(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     bank_account_id: str = Form(...),
     format: Optional[BankStatementFormat] = Form(None),
+    bank_repo: BankRepository = Depends(get_bank_repo),
+    matching_service: PaymentMatchingService = Depends(get_matching_service),
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -117,121 +150,212 @@ async def import_bank_statement(
 
     If the format is not provided (or is incorrect), the backend will attempt
     to auto-detect it from the file contents before parsing.
-    """
-    try:
-        bank_repo = BankRepository(db)
-        accounting_repo = AccountingRepository()
 
-        # Verify bank account ownership
-        organization_id = current_user.get("organization_id") or current_user["_id"]
-        organization_id = str(organization_id) if not isinstance(organization_id, str) else organization_id
-        user_id = str(current_user["_id"]) if not isinstance(current_user["_id"], str) else current_user["_id"]
-        bank_account = bank_repo.get_bank_account(bank_account_id)
+    Automatic payment matching is queued as a background job and runs after
+    the response has been sent.
+    """
+    # Verify bank account ownership
+    organization_id = current_user["organization_id"]
+    user_id = current_user["_id"]
+    owns_account = ObjectId.is_valid(bank_account_id) and await run_in_threadpool(
+        bank_repo.bank_account_belongs_to_org, bank_account_id, organization_id
+    )
 
-        if not bank_account or bank_account.organization_id != organization_id:
-            raise HTTPException(status_code=403, detail="Invalid bank account")
+    if not owns_account:
+        raise HTTPException(status_code=403, detail="Invalid bank account")
 
-        # Read file content
-        file_content = await file.read()
+    # Read the upload in chunks, hashing each one as it arrives so the
+    # parser doesn't have to make a second pass over the whole file
+    hasher = hashlib.sha256()
+    chunks = []
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+        chunks.append(chunk)
+    file_content = b"".join(chunks)
 
-        # Parse statement
-        parser = BankStatementParser(organization_id, bank_account_id)
-        statement, transactions = parser.parse_file(
+    # Parse statement
+    parser = BankStatementParser(organization_id, bank_account_id)
+    try:
+        statement, transactions = await run_in_threadpool(
+            parser.parse_file,
             file_content=file_content,
             file_name=file.filename,
             format_type=format,
             imported_by=user_id,
+            file_hash=hasher.hexdigest(),
         )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        if not transactions:
-            raise HTTPException(
-                status_code=400,
-                detail="No transactions were parsed from the provided statement file",
-            )
-
-        # Check for duplicate import
-        existing = bank_repo.get_statement_by_hash(statement.file_hash)
-        if existing:
-            raise HTTPException(
-                status_code=400,
-                detail="This statement has already been imported"
-            )
-
-        # Save statement
-        statement_id = bank_repo.create_bank_statement(statement)
-
-        # Save transactions
-        for trans in transactions:
-            trans.statement_id = statement_id
-
-        transaction_ids = bank_repo.create_transactions_bulk(transactions)
-
-        # Update bank account balance
-        if statement.closing_balance:
-            bank_repo.update_bank_account_balance(
-                bank_account_id, statement.closing_balance
-            )
-
-        # Auto-match transactions
-        matching_service = PaymentMatchingService(bank_repo, accounting_repo)
-        match_stats = matching_service.match_all_unmatched_transactions(
-            organization_id
+    if not transactions:
+        raise HTTPException(
+            status_code=400,
+            detail="No transactions were parsed from the provided statement file",
         )
 
-        return {
-            "statement_id": statement_id,
-            "transactions_imported": len(transaction_ids),
-            "from_date": statement.from_date.isoformat(),
-            "to_date": statement.to_date.isoformat(),
-            "total_debits": statement.total_debits,
-            "total_credits": statement.total_credits,
-            "matching_stats": match_stats,
-            "message": "Bank statement imported successfully",
-        }
+    # Save statement; the unique file_hash index rejects duplicate imports
+    try:
+        statement_id = await run_in_threadpool(bank_repo.create_bank_statement, statement)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail="This statement has already been imported"
+        )
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    # Save transactions (one insert_many per batch, tagged with the statement)
+    try:
+        transaction_ids = await run_in_threadpool(
+            bank_repo.create_transactions_bulk, transactions, statement_id
+        )
+    except BulkWriteError as e:
+        logger.error(
+            f"Partial import of statement {statement_id}: "
+            f"{e.details.get('nInserted', 0)} inserted, "
+            f"{len(e.details.get('writeErrors', []))} write errors"
+        )
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "message": "Some transactions could not be saved",
+                "statement_id": statement_id,
+                "inserted": e.details.get("nInserted", 0),
+            },
+        )
 
+    # Update bank account balance
+    if statement.closing_balance:
+        await run_in_threadpool(
+            bank_repo.update_bank_account_balance,
+            bank_account_id, statement.closing_balance, organization_id
+        )
+
+    # Queue auto-matching so the client doesn't wait on it; progress can be
+    # polled at /bank/match-status/{job_id}
+    job_id = uuid.uuid4().hex
+    await run_in_threadpool(bank_repo.create_matching_job, job_id, organization_id)
+    background_tasks.add_task(
+        _run_auto_matching, matching_service, organization_id, job_id
+    )
+
+    return {
+        "status": "queued",
+        "statement_id": statement_id,
+        "job_id": job_id,
+        "transactions_imported": len(transaction_ids),
+        "from_date": statement.from_date.isoformat(),
+        "to_date": statement.to_date.isoformat(),
+        "total_debits": statement.total_debits,
+        "total_credits": statement.total_credits,
+        "message": "Bank statement imported successfully",
+    }
 
 # ===== Transaction Management =====
 
-@router.get("/bank/transactions", response_model=List[dict])
+def _validate_transaction_id(transaction_id: str) -> None:
+    """Reject malformed transaction ids before they reach the database"""
+    if not ObjectId.is_valid(transaction_id):
+        raise HTTPException(status_code=400, detail="Invalid transaction ID")
+
+
+def _encode_transaction_cursor(doc: dict) -> str:
+    """Build an opaque list cursor from a transaction's (date, id) position"""
+    raw = f"{doc['transaction_date'].isoformat()}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_transaction_cursor(cursor: str):
+    """Decode a list cursor back into (transaction_date, transaction id)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_part, id_part = raw.split("|", 1)
+        return datetime.fromisoformat(date_part), str(ObjectId(id_part))
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+
+@router.get("/bank/transactions", response_model=None)
 async def list_transactions(
     bank_account_id: Optional[str] = None,
     from_date: Optional[str] = None,
     to_date: Optional[str] = None,
     status: Optional[str] = None,
     match_status: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
-    """Get bank transactions with filters"""
-    bank_repo = BankRepository(db)
+    """
+    Get bank transactions with filters
+
+    Results are cursor-paginated: when more rows may follow, the
+    X-Next-Cursor response header carries the value to pass as `after`
+    to fetch the next page. The first page (no `after`) also reports the
+    total number of matching transactions in X-Total-Count.
+    """
+    organization_id = current_user["organization_id"]
 
     # Parse dates if provided
     from_dt = datetime.fromisoformat(from_date) if from_date else None
     to_dt = datetime.fromisoformat(to_date) if to_date else None
+    after_dt, after_id = _decode_transaction_cursor(after) if after else (None, None)
+
+    # Plain dict instead of a TransactionFilter model: nothing here needs validating
+    filters = {
+        "organization_id": organization_id,
+        "bank_account_id": bank_account_id,
+        "from_date": from_dt,
+        "to_date": to_dt,
+        "status": status,
+        "match_status": match_status,
+    }
 
-    filters = TransactionFilter(
-        bank_account_id=bank_account_id,
-        from_date=from_dt,
-        to_date=to_dt,
-        status=status,
-        match_status=match_status,
-    )
+    headers = {}
+    if after:
+        transactions = await run_in_threadpool(
+            bank_repo.query_transactions,
+            filters,
+            limit,
+            after_date=after_dt,
+            after_id=after_id,
+            projection=TRANSACTION_LIST_PROJECTION,
+        )
+    else:
+        # First page: fetch rows and the total match count in one round trip
+        transactions, total = await run_in_threadpool(
+            bank_repo.query_transactions_paged,
+            filters,
+            limit,
+            projection=TRANSACTION_LIST_PROJECTION,
+        )
+        headers["X-Total-Count"] = str(total)
 
-    transactions = bank_repo.query_transactions(filters, skip, limit)
-    return [t.dict(by_alias=True) for t in transactions]
+    if transactions and len(transactions) == limit:
+        headers["X-Next-Cursor"] = _encode_transaction_cursor(transactions[-1])
+
+    return ORJSONResponse(transactions, headers=headers)
 
 
 # ===== Convert Transactions to Ledger (must come before parameterized routes) =====
 
+def _journal_line(
+    account_code: str, entry_type: str, amount: float, description: str, reference: Optional[str]
+) -> dict:
+    """Build one side of a bank transaction's journal entry"""
+    return {
+        "account_code": account_code,
+        "entry_type": entry_type,
+        "amount": amount,
+        "description": description,
+        "reference": reference,
+    }
+
+
 @router.post("/bank/transactions/to-ledger", response_model=dict, status_code=200)
-async def convert_transactions_to_ledger(
+def convert_transactions_to_ledger(
     request: TransactionsToLedgerRequest,
+    bank_repo: BankRepository = Depends(get_bank_repo),
+    accounting_repo: AccountingRepository = Depends(get_accounting_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """
@@ -246,11 +370,8 @@ async def convert_transactions_to_ledger(
     }
     """
     try:
-        bank_repo = BankRepository(db)
-        accounting_repo = AccountingRepository()
-        user_id = str(current_user["_id"]) if not isinstance(current_user["_id"], str) else current_user["_id"]
-        organization_id = current_user.get("organization_id") or current_user["_id"]
-        organization_id = str(organization_id) if not isinstance(organization_id, str) else organization_id
+        user_id = current_user["_id"]
+        organization_id = current_user["organization_id"]
 
         transaction_ids = request.transaction_ids
 
@@ -265,10 +386,28 @@ async def convert_transactions_to_ledger(
             "errors": []
         }
 
+        # Validate ids and fetch every requested transaction in one query
+        valid_oids = []
+        invalid_ids = set()
+        for trans_id in transaction_ids:
+            try:
+                valid_oids.append(ObjectId(trans_id))
+            except (InvalidId, TypeError):
+                invalid_ids.add(trans_id)
+
+        transactions_by_id = bank_repo.get_transactions_by_ids(valid_oids)
+
         for trans_id in transaction_ids:
             try:
-                # Get transaction
-                transaction = bank_repo.get_transaction(trans_id)
+                if trans_id in invalid_ids:
+                    results["errors"].append({
+                        "transaction_id": trans_id,
+                        "error": "Invalid transaction ID"
+                    })
+                    results["failed"] += 1
+                    continue
+
+                transaction = transactions_by_id.get(str(ObjectId(trans_id)))
 
                 if not transaction:
                     results["errors"].append({
@@ -297,7 +436,8 @@ async def convert_transactions_to_ledger(
                     continue
 
                 # Create journal entries for this transaction
-                from app.models.accounting import JournalEntryCreate, JournalEntryType
+                # One timestamp for every record written for this transaction
+                now = datetime.utcnow()
 
                 # Get or create "Bank" journal
                 bank_journal = accounting_repo.db["journals"].find_one({
@@ -314,10 +454,11 @@ async def convert_transactions_to_ledger(
                         "journal_type": "bank",
                         "description": "Bank account transactions",
                         "is_active": True,
-                        "created_at": datetime.utcnow()
+                        "created_at": now
                     }
                     result = accounting_repo.db["journals"].insert_one(bank_journal_data)
-                    bank_journal = accounting_repo.db["journals"].find_one({"_id": result.inserted_id})
+                    bank_journal_data["_id"] = result.inserted_id
+                    bank_journal = bank_journal_data
 
                 journal_id = str(bank_journal["_id"])
 
@@ -330,12 +471,21 @@ async def convert_transactions_to_ledger(
                 bank_account_code = None
 
                 if bank_account_obj:
-                    # Try to find matching account in chart of accounts by account number/IBAN
+                    # Chart of accounts code/name used for this bank account (1020 = Bank accounts)
+                    ledger_code = f"1020-{bank_account_obj.account_number[-4:]}"
+                    ledger_name = f"Bank - {bank_account_obj.account_name}"
+
+                    # Find matching account in chart of accounts by account number or name
+                    # (indexed equality on the uppercased lookup keys)
                     chart_account = accounting_repo.db["accounts"].find_one({
                         "organization_id": organization_id,
                         "$or": [
-                            {"account_code": {"$regex": bank_account_obj.account_number, "$options": "i"}},
-                            {"account_name": {"$regex": bank_account_obj.account_name, "$options": "i"}}
+                            {"account_code_upper": {"$in": [
+                                bank_account_obj.account_number.upper(), ledger_code.upper()
+                            ]}},
+                            {"account_name_upper": {"$in": [
+                                bank_account_obj.account_name.upper(), ledger_name.upper()
+                            ]}}
                         ]
                     })
 
@@ -343,69 +493,39 @@ async def convert_transactions_to_ledger(
                         bank_account_code = chart_account["account_code"]
                     else:
                         # Create a new bank account in chart of accounts
-                        bank_account_code = f"1020-{bank_account_obj.account_number[-4:]}"  # 1020 = Bank accounts
+                        bank_account_code = ledger_code
 
                         new_account = {
                             "organization_id": organization_id,
                             "account_code": bank_account_code,
-                            "account_name": f"Bank - {bank_account_obj.account_name}",
+                            "account_name": ledger_name,
+                            **account_lookup_keys(bank_account_code, ledger_name),
                             "account_type": "ASSET",
                             "account_subtype": "CURRENT_ASSET",
                             "is_active": True,
                             "current_balance": 0.0,
                             "currency": transaction.currency,
-                            "created_at": datetime.utcnow()
+                            "created_at": now
                         }
                         accounting_repo.db["accounts"].insert_one(new_account)
 
                 # Prepare journal entry data
-                if transaction.transaction_type == "credit":
-                    # Money coming in - Debit Bank, Credit Revenue
-                    # Use counterparty name or default description
-                    description = transaction.description or f"Bank transfer from {transaction.counterparty_name or 'Unknown'}"
-
-                    # Default revenue account
-                    revenue_account_code = "4000"  # Revenue account
+                is_credit = transaction.transaction_type == "credit"
+                description = transaction.description or (
+                    f"Bank transfer {'from' if is_credit else 'to'} "
+                    f"{transaction.counterparty_name or 'Unknown'}"
+                )
+                reference = transaction.reference or transaction.transaction_id
 
-                    entries = [
-                        {
-                            "account_code": bank_account_code,
-                            "entry_type": "DEBIT",
-                            "amount": transaction.amount,
-                            "description": description,
-                            "reference": transaction.reference or transaction.transaction_id
-                        },
-                        {
-                            "account_code": revenue_account_code,
-                            "entry_type": "CREDIT",
-                            "amount": transaction.amount,
-                            "description": description,
-                            "reference": transaction.reference or transaction.transaction_id
-                        }
-                    ]
-                else:
-                    # Money going out - Debit Expense, Credit Bank
-                    description = transaction.description or f"Bank transfer to {transaction.counterparty_name or 'Unknown'}"
-
-                    # Default expense account
-                    expense_account_code = "5000"  # Expense account
-
-                    entries = [
-                        {
-                            "account_code": expense_account_code,
-                            "entry_type": "DEBIT",
-                            "amount": transaction.amount,
-                            "description": description,
-                            "reference": transaction.reference or transaction.transaction_id
-                        },
-                        {
-                            "account_code": bank_account_code,
-                            "entry_type": "CREDIT",
-                            "amount": transaction.amount,
-                            "description": description,
-                            "reference": transaction.reference or transaction.transaction_id
-                        }
-                    ]
+                # Money in: Debit Bank, Credit Revenue (4000)
+                # Money out: Debit Expense (5000), Credit Bank
+                debit_code, credit_code = (
+                    (bank_account_code, "4000") if is_credit else ("5000", bank_account_code)
+                )
+                entries = [
+                    _journal_line(debit_code, "DEBIT", transaction.amount, description, reference),
+                    _journal_line(credit_code, "CREDIT", transaction.amount, description, reference),
+                ]
 
                 # Create journal entry record
                 journal_entry_doc = {
@@ -419,8 +539,8 @@ async def convert_transactions_to_ledger(
                     "total_credit": transaction.amount,
                     "status": "posted",
                     "created_by": user_id,
-                    "created_at": datetime.utcnow(),
-                    "posted_at": datetime.utcnow(),
+                    "created_at": now,
+                    "posted_at": now,
                     "posted_by": user_id,
                     "source": "bank_import",
                     "source_id": trans_id
@@ -430,7 +550,10 @@ async def convert_transactions_to_ledger(
                 je_result = accounting_repo.db["journal_entries"].insert_one(journal_entry_doc)
                 journal_entry_id = str(je_result.inserted_id)
 
-                # Create ledger entries
+                # Create ledger entries; rows and balance updates are written
+                # together once both lines are built
+                ledger_docs = []
+                new_balances = {}
                 for entry in entries:
                     # Get account details
                     account = accounting_repo.db["accounts"].find_one({
@@ -439,13 +562,15 @@ async def convert_transactions_to_ledger(
                     })
 
                     if account:
-                        # Calculate running balance
-                        last_ledger = accounting_repo.db["ledger_entries"].find_one(
-                            {"account_id": str(account["_id"])},
-                            sort=[("created_at", -1)]
-                        )
-
-                        running_balance = last_ledger["running_balance"] if last_ledger else account.get("current_balance", 0.0)
+                        # Calculate running balance (from this batch if the account was already hit)
+                        if account["_id"] in new_balances:
+                            running_balance = new_balances[account["_id"]]
+                        else:
+                            last_ledger = accounting_repo.db["ledger_entries"].find_one(
+                                {"account_id": str(account["_id"])},
+                                sort=[("created_at", -1)]
+                            )
+                            running_balance = last_ledger["running_balance"] if last_ledger else account.get("current_balance", 0.0)
 
                         if entry["entry_type"] == "DEBIT":
                             running_balance += entry["amount"]
@@ -453,7 +578,7 @@ async def convert_transactions_to_ledger(
                             running_balance -= entry["amount"]
 
                         # Create ledger entry
-                        ledger_entry = {
+                        ledger_docs.append({
                             "organization_id": organization_id,
                             "account_id": str(account["_id"]),
                             "account_code": entry["account_code"],
@@ -467,18 +592,20 @@ async def convert_transactions_to_ledger(
                             "description": entry["description"],
                             "reference": entry["reference"],
                             "journal_entry_id": journal_entry_id,
-                            "posted_at": datetime.utcnow(),
+                            "posted_at": now,
                             "posted_by": user_id,
-                            "created_at": datetime.utcnow()
-                        }
+                            "created_at": now
+                        })
+                        new_balances[account["_id"]] = running_balance
 
-                        accounting_repo.db["ledger_entries"].insert_one(ledger_entry)
+                if ledger_docs:
+                    accounting_repo.db["ledger_entries"].insert_many(ledger_docs, ordered=False)
 
-                        # Update account balance
-                        accounting_repo.db["accounts"].update_one(
-                            {"_id": account["_id"]},
-                            {"$set": {"current_balance": running_balance}}
-                        )
+                    # Update account balances
+                    accounting_repo.db["accounts"].bulk_write([
+                        UpdateOne({"_id": account_id}, {"$set": {"current_balance": balance}})
+                        for account_id, balance in new_balances.items()
+                    ], ordered=False)
 
                 # Update transaction with ledger entry reference and mark as processed
                 bank_repo.db["bank_transactions"].update_one(
@@ -486,7 +613,7 @@ async def convert_transactions_to_ledger(
                     {"$set": {
                         "ledger_entry_id": journal_entry_id,
                         "status": "processed",
-                        "updated_at": datetime.utcnow()
+                        "updated_at": now
                     }}
                 )
 
@@ -514,33 +641,41 @@ async def convert_transactions_to_ledger(
         raise HTTPException(status_code=500, detail=f"Error converting transactions to ledger: {str(e)}")
 
 
-@router.get("/bank/transactions/{transaction_id}", response_model=dict)
+@router.get("/bank/transactions/{transaction_id}", response_model=None)
 async def get_transaction(
     transaction_id: str,
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get transaction details"""
-    bank_repo = BankRepository(db)
-    transaction = bank_repo.get_transaction(transaction_id)
+    transaction = await run_in_threadpool(bank_repo.get_transaction, transaction_id)
 
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
 
-    return transaction.dict(by_alias=True)
+    return ORJSONResponse(transaction.model_dump(mode="json", by_alias=True))
 
 
-@router.patch("/bank/transactions/{transaction_id}", response_model=dict)
+@router.patch(
+    "/bank/transactions/{transaction_id}",
+    response_model=MessageResponse,
+    response_model_exclude_none=True,
+)
 async def update_transaction(
     transaction_id: str,
     update: BankTransactionUpdate,
+    bank_repo: BankRepository = Depends(get_bank_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Update transaction"""
-    bank_repo = BankRepository(db)
-    success = bank_repo.update_transaction_status(
+    _validate_transaction_id(transaction_id)
+
+    success = await run_in_threadpool(
+        bank_repo.update_transaction_status,
         transaction_id,
         update.status,
         update.match_status,
+        organization_id=current_user["organization_id"],
     )
 
     if not success:
@@ -554,25 +689,34 @@ async def update_transaction(
 @router.post("/bank/transactions/{transaction_id}/match", response_model=dict)
 async def manual_match_transaction(
     transaction_id: str,
-    invoice_id: str,
-    voucher_id: Optional[str] = None,
-    notes: Optional[str] = None,
+    body: ManualMatchRequest,
+    matching_service: PaymentMatchingService = Depends(get_matching_service),
     current_user: dict = Depends(get_current_user),
 ):
-    """Manually match transaction to invoice"""
-    bank_repo = BankRepository(db)
-    accounting_repo = AccountingRepository()
-    matching_service = PaymentMatchingService(bank_repo, accounting_repo)
-
-    user_id = str(current_user["_id"]) if not isinstance(current_user["_id"], str) else current_user["_id"]
-
-    match = matching_service.manual_match(
-        transaction_id=transaction_id,
-        invoice_id=invoice_id,
-        voucher_id=voucher_id,
-        user_id=user_id,
-        notes=notes,
-    )
+    """
+    Manually match transaction to invoice
+
+    Request body:
+    {
+        "invoice_id": "...",
+        "voucher_id": "...",  (optional)
+        "notes": "..."        (optional)
+    }
+    """
+    _validate_transaction_id(transaction_id)
+
+    try:
+        match = await run_in_threadpool(
+            matching_service.manual_match,
+            transaction_id=transaction_id,
+            invoice_id=body.invoice_id,
+            voucher_id=body.voucher_id,
+            user_id=current_user["_id"],
+            organization_id=current_user["organization_id"],
+            notes=body.notes,
+        )
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Transaction not found")
 
     return {
         "match_id": str(match.id),
@@ -580,17 +724,24 @@ async def manual_match_transaction(
     }
 
 
-@router.post("/bank/transactions/{transaction_id}/unmatch", response_model=dict)
+@router.post(
+    "/bank/transactions/{transaction_id}/unmatch",
+    response_model=MessageResponse,
+    response_model_exclude_none=True,
+)
 async def unmatch_transaction(
     transaction_id: str,
+    matching_service: PaymentMatchingService = Depends(get_matching_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Unmatch transaction from invoice"""
-    bank_repo = BankRepository(db)
-    accounting_repo = AccountingRepository()
-    matching_service = PaymentMatchingService(bank_repo, accounting_repo)
+    _validate_transaction_id(transaction_id)
 
-    success = matching_service.unmatch_transaction(transaction_id)
+    success = await run_in_threadpool(
+        matching_service.unmatch_transaction,
+        transaction_id,
+        current_user["organization_id"],
+    )
 
     if not success:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -600,18 +751,38 @@ async def unmatch_transaction(
 
 @router.post("/bank/match-all", response_model=dict)
 async def auto_match_all_transactions(
+    matching_service: PaymentMatchingService = Depends(get_matching_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Run automatic matching for all unmatched transactions"""
-    organization_id = current_user.get("organization_id") or current_user["_id"]
-    organization_id = str(organization_id) if not isinstance(organization_id, str) else organization_id
-
-    bank_repo = BankRepository(db)
-    accounting_repo = AccountingRepository()
-    matching_service = PaymentMatchingService(bank_repo, accounting_repo)
-    stats = matching_service.match_all_unmatched_transactions(organization_id)
+    stats = await run_in_threadpool(
+        matching_service.match_all_unmatched_transactions,
+        current_user["organization_id"],
+    )
 
     return {
         "stats": stats,
         "message": "Automatic matching completed",
     }
+
+
+@router.get("/bank/match-status/{job_id}", response_model=dict)
+async def get_matching_job_status(
+    job_id: str,
+    bank_repo: BankRepository = Depends(get_bank_repo),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get the status of a background auto-matching job
+
+    status is one of queued, running, completed or failed; stats is set
+    once the job has completed.
+    """
+    job = await run_in_threadpool(
+        bank_repo.get_matching_job, job_id, current_user["organization_id"]
+    )
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Matching job not found")
+
+    return job
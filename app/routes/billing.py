@@ -3,11 +3,11 @@ Billing and Subscription API Routes
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
-from typing import List, Optional
-from pymongo import MongoClient
-import os
-import certifi
-from dotenv import load_dotenv
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from typing import Optional
+from functools import lru_cache
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime
 
 from app.models.billing import (
@@ -26,50 +26,52 @@ from app.repos.billing_repo import BillingRepository
 from app.services.stripe_service import StripeService
 from app.services.billing_automation_service import BillingAutomationService
 from app.routes.auth import get_current_user
+from app.db import db
 
-# Load environment
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+router = APIRouter(tags=["Billing & Subscriptions"])
 
-# Database connection
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
 
-router = APIRouter(tags=["Billing & Subscriptions"])
+# ===== Dependencies =====
+# Built once per process and shared across requests.
+
+@lru_cache(maxsize=1)
+def get_billing_repo() -> BillingRepository:
+    return BillingRepository(db)
+
+
+@lru_cache(maxsize=1)
+def get_stripe_service() -> StripeService:
+    return StripeService(get_billing_repo())
 
 
-# Helper function to convert ObjectId to string
-def ensure_str(value):
-    """Convert ObjectId or any value to string"""
-    return str(value) if not isinstance(value, str) else value
+@lru_cache(maxsize=1)
+def get_billing_automation() -> BillingAutomationService:
+    return BillingAutomationService(get_billing_repo(), get_stripe_service())
 
 
 # ===== Subscription Plans =====
 
-@router.get("/billing/plans", response_model=List[dict])
-async def list_subscription_plans():
+@router.get("/billing/plans", response_model=None)
+async def list_subscription_plans(
+    billing_repo: BillingRepository = Depends(get_billing_repo),
+):
     """Get all active subscription plans"""
-    billing_repo = BillingRepository(db)
-    plans = billing_repo.get_active_plans()
-    return [p.dict(by_alias=True) for p in plans]
+    plans = await run_in_threadpool(billing_repo.get_active_plans)
+    return ORJSONResponse([p.model_dump(mode="json", by_alias=True) for p in plans])
 
 
 # ===== User Subscription =====
 
 @router.post("/billing/subscribe", response_model=dict)
-async def create_subscription(
+def create_subscription(
     subscription_create: SubscriptionCreate,
+    billing_repo: BillingRepository = Depends(get_billing_repo),
+    stripe_service: StripeService = Depends(get_stripe_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Create a new subscription"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-
-    # Convert ObjectId to string
-    user_id = str(current_user["_id"]) if not isinstance(current_user["_id"], str) else current_user["_id"]
-    org_id = current_user.get("organization_id") or current_user["_id"]
-    org_id = str(org_id) if not isinstance(org_id, str) else org_id
+    user_id = current_user["_id"]
+    org_id = current_user["organization_id"]
 
     # Get plan
     plan = billing_repo.get_plan(subscription_create.plan_id)
@@ -108,12 +110,12 @@ async def create_subscription(
 
 @router.get("/billing/subscription", response_model=dict)
 async def get_my_subscription(
+    billing_repo: BillingRepository = Depends(get_billing_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get current user's subscription"""
-    billing_repo = BillingRepository(db)
-    user_id = ensure_str(current_user["_id"])
-    subscription = billing_repo.get_subscription_by_user(user_id)
+    user_id = current_user["_id"]
+    subscription = await run_in_threadpool(billing_repo.get_subscription_by_user, user_id)
 
     if not subscription:
         raise HTTPException(status_code=404, detail="No active subscription found")
@@ -124,19 +126,19 @@ async def get_my_subscription(
 @router.post("/billing/subscription/cancel", response_model=dict)
 async def cancel_subscription(
     cancel_immediately: bool = False,
+    billing_repo: BillingRepository = Depends(get_billing_repo),
+    stripe_service: StripeService = Depends(get_stripe_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Cancel subscription"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-    user_id = ensure_str(current_user["_id"])
-    subscription = billing_repo.get_subscription_by_user(user_id)
+    user_id = current_user["_id"]
+    subscription = await run_in_threadpool(billing_repo.get_subscription_by_user, user_id)
 
     if not subscription:
         raise HTTPException(status_code=404, detail="No active subscription found")
 
-    success = stripe_service.cancel_subscription(
-        str(subscription.id), cancel_immediately
+    success = await run_in_threadpool(
+        stripe_service.cancel_subscription, str(subscription.id), cancel_immediately
     )
 
     return {
@@ -150,29 +152,28 @@ async def cancel_subscription(
 @router.post("/billing/payment-methods", response_model=dict)
 async def add_payment_method(
     payment_method: PaymentMethodCreate,
+    billing_repo: BillingRepository = Depends(get_billing_repo),
+    stripe_service: StripeService = Depends(get_stripe_service),
     current_user: dict = Depends(get_current_user),
 ):
     """Add payment method"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-
-    user_id = ensure_str(current_user["_id"])
-    org_id = ensure_str(current_user.get("organization_id") or current_user["_id"])
+    user_id = current_user["_id"]
+    org_id = current_user["organization_id"]
 
     # Get or create Stripe customer
-    subscription = billing_repo.get_subscription_by_user(user_id)
+    subscription = await run_in_threadpool(billing_repo.get_subscription_by_user, user_id)
 
     if not subscription:
         raise HTTPException(status_code=400, detail="No active subscription")
 
     # Attach payment method
-    pm = stripe_service.attach_payment_method(
+    pm = await run_in_threadpool(lambda: stripe_service.attach_payment_method(
         user_id=user_id,
         organization_id=org_id,
         stripe_customer_id=subscription.stripe_customer_id,
         payment_method_id=payment_method.stripe_payment_method_id,
         set_as_default=payment_method.set_as_default,
-    )
+    ))
 
     return {
         "payment_method_id": str(pm.id),
@@ -180,60 +181,63 @@ async def add_payment_method(
     }
 
 
-@router.get("/billing/payment-methods", response_model=List[dict])
+@router.get("/billing/payment-methods", response_model=None)
 async def list_payment_methods(
+    billing_repo: BillingRepository = Depends(get_billing_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get user's payment methods"""
-    billing_repo = BillingRepository(db)
-    user_id = ensure_str(current_user["_id"])
-    methods = billing_repo.get_payment_methods_by_user(user_id)
-    return [m.dict(by_alias=True) for m in methods]
+    user_id = current_user["_id"]
+    methods = await run_in_threadpool(billing_repo.get_payment_methods_by_user, user_id)
+    return ORJSONResponse([m.model_dump(mode="json", by_alias=True) for m in methods])
 
 
 # ===== Payment History =====
 
-@router.get("/billing/transactions", response_model=List[dict])
+@router.get("/billing/transactions", response_model=None)
 async def list_payment_transactions(
     limit: int = 50,
+    billing_repo: BillingRepository = Depends(get_billing_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get payment transaction history"""
-    billing_repo = BillingRepository(db)
-    user_id = ensure_str(current_user["_id"])
-    transactions = billing_repo.get_transactions_by_user(user_id, limit)
-    return [t.dict(by_alias=True) for t in transactions]
+    user_id = current_user["_id"]
+    transactions = await run_in_threadpool(
+        billing_repo.get_transactions_by_user, user_id, limit
+    )
+    return ORJSONResponse([t.model_dump(mode="json", by_alias=True) for t in transactions])
 
 
-@router.get("/billing/billing-cycles", response_model=List[dict])
+@router.get("/billing/billing-cycles", response_model=None)
 async def list_billing_cycles(
+    billing_repo: BillingRepository = Depends(get_billing_repo),
     current_user: dict = Depends(get_current_user),
 ):
     """Get billing cycle history"""
-    billing_repo = BillingRepository(db)
-    user_id = ensure_str(current_user["_id"])
-    subscription = billing_repo.get_subscription_by_user(user_id)
+    user_id = current_user["_id"]
+    subscription = await run_in_threadpool(billing_repo.get_subscription_by_user, user_id)
 
     if not subscription:
         raise HTTPException(status_code=404, detail="No subscription found")
 
-    cycles = billing_repo.get_billing_cycles_by_subscription(str(subscription.id))
-    return [c.dict(by_alias=True) for c in cycles]
+    cycles = await run_in_threadpool(
+        billing_repo.get_billing_cycles_by_subscription, str(subscription.id)
+    )
+    return ORJSONResponse([c.model_dump(mode="json", by_alias=True) for c in cycles])
 
 
 # ===== Subscription Status =====
 
 @router.get("/billing/status", response_model=dict)
 async def get_subscription_status(
+    billing_automation: BillingAutomationService = Depends(get_billing_automation),
     current_user: dict = Depends(get_current_user),
 ):
     """Get subscription status summary"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-    billing_automation = BillingAutomationService(billing_repo, stripe_service)
-
-    user_id = ensure_str(current_user["_id"])
-    summary = billing_automation.get_subscription_status_summary(user_id)
+    user_id = current_user["_id"]
+    summary = await run_in_threadpool(
+        billing_automation.get_subscription_status_summary, user_id
+    )
 
     if not summary:
         raise HTTPException(status_code=404, detail="No subscription found")
@@ -249,15 +253,19 @@ async def get_subscription_status(
 
 @router.get("/billing/check-access", response_model=dict)
 async def check_feature_access(
+    billing_automation: BillingAutomationService = Depends(get_billing_automation),
     current_user: dict = Depends(get_current_user),
 ):
     """Check if user can access features"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-    billing_automation = BillingAutomationService(billing_repo, stripe_service)
-
-    user_id = ensure_str(current_user["_id"])
-    can_access = billing_automation.check_subscription_features(user_id)
+    # Tokens issued to subscribers carry a short-lived access claim
+    access_until = current_user.get("sub_access_until")
+    if access_until and datetime.fromisoformat(access_until) > datetime.utcnow():
+        return {"can_access_features": True, "message": "Access granted"}
+
+    user_id = current_user["_id"]
+    can_access = await run_in_threadpool(
+        billing_automation.check_subscription_features, user_id
+    )
 
     return {
         "can_access_features": can_access,
@@ -267,46 +275,74 @@ async def check_feature_access(
     }
 
 
+@router.get("/billing/me", response_model=dict)
+async def get_my_billing_overview(
+    billing_automation: BillingAutomationService = Depends(get_billing_automation),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Get subscription status summary and feature access in one call
+
+    Combines /billing/status and /billing/check-access using a single
+    subscription lookup. status_summary is null when the user has no
+    subscription.
+    """
+    overview = await run_in_threadpool(
+        billing_automation.get_billing_overview, current_user["_id"]
+    )
+    can_access = overview["can_access_features"]
+
+    return {
+        **overview,
+        "message": (
+            "Access granted" if can_access else "Access denied - subscription inactive or suspended"
+        ),
+    }
+
+
 # ===== Stripe Webhooks =====
 
 @router.post("/billing/webhook")
 async def stripe_webhook(
     request: Request,
     stripe_signature: str = Header(None, alias="stripe-signature"),
+    billing_repo: BillingRepository = Depends(get_billing_repo),
+    stripe_service: StripeService = Depends(get_stripe_service),
 ):
     """Handle Stripe webhook events"""
-    billing_repo = BillingRepository(db)
-    stripe_service = StripeService(billing_repo)
-
     payload = await request.body()
 
+    # Verify webhook signature (bad payloads/signatures raise ValueError)
     try:
-        # Verify webhook signature
         event = stripe_service.construct_webhook_event(payload, stripe_signature)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Save webhook event
-        webhook_event = WebhookEvent(
-            event_id=event["id"],
-            event_type=event["type"],
-            provider=PaymentProvider.STRIPE,
-            payload=event,
-        )
-
-        webhook_id = billing_repo.create_webhook_event(webhook_event)
-
-        # Process event
-        await process_stripe_webhook(event, billing_repo, stripe_service)
+    # Save webhook event
+    webhook_event = WebhookEvent(
+        event_id=event["id"],
+        event_type=event["type"],
+        provider=PaymentProvider.STRIPE,
+        payload=event,
+    )
 
-        # Mark as processed
-        billing_repo.mark_webhook_processed(webhook_id)
+    try:
+        webhook_id = await run_in_threadpool(billing_repo.create_webhook_event, webhook_event)
+    except DuplicateKeyError:
+        # Redelivery of an event we already stored (event_id is unique);
+        # only re-run it if the earlier delivery never finished processing
+        existing = await run_in_threadpool(billing_repo.get_webhook_event, event["id"])
+        if not existing or existing.is_processed:
+            return {"status": "duplicate"}
+        webhook_id = str(existing.id)
 
-        return {"status": "success"}
+    # Process event; unexpected errors propagate as a 500 so Stripe retries
+    await process_stripe_webhook(event, billing_repo, stripe_service)
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Mark as processed
+    await run_in_threadpool(billing_repo.mark_webhook_processed, webhook_id)
 
+    return {"status": "success"}
 
 async def process_stripe_webhook(event: dict, billing_repo: BillingRepository, stripe_service: StripeService):
     """Process Stripe webhook events"""
@@ -315,10 +351,13 @@ async def process_stripe_webhook(event: dict, billing_repo: BillingRepository, s
     if event_type == "payment_intent.succeeded":
         # Update payment transaction
         payment_intent = event["data"]["object"]
-        transaction = billing_repo.get_transaction_by_payment_intent(payment_intent["id"])
+        transaction = await run_in_threadpool(
+            billing_repo.get_transaction_by_payment_intent, payment_intent["id"]
+        )
 
         if transaction:
-            billing_repo.update_payment_transaction(
+            await run_in_threadpool(
+                billing_repo.update_payment_transaction,
                 str(transaction.id),
                 {
                     "status": PaymentStatus.SUCCEEDED,
@@ -329,10 +368,13 @@ async def process_stripe_webhook(event: dict, billing_repo: BillingRepository, s
     elif event_type == "payment_intent.payment_failed":
         # Handle failed payment
         payment_intent = event["data"]["object"]
-        transaction = billing_repo.get_transaction_by_payment_intent(payment_intent["id"])
+        transaction = await run_in_threadpool(
+            billing_repo.get_transaction_by_payment_intent, payment_intent["id"]
+        )
 
         if transaction:
-            billing_repo.update_payment_transaction(
+            await run_in_threadpool(
+                billing_repo.update_payment_transaction,
                 str(transaction.id),
                 {
                     "status": PaymentStatus.FAILED,
@@ -345,11 +387,14 @@ async def process_stripe_webhook(event: dict, billing_repo: BillingRepository, s
     elif event_type == "customer.subscription.deleted":
         # Handle subscription cancellation
         subscription_data = event["data"]["object"]
-        subscription = billing_repo.get_subscription_by_stripe_id(subscription_data["id"])
+        subscription = await run_in_threadpool(
+            billing_repo.get_subscription_by_stripe_id, subscription_data["id"]
+        )
 
         if subscription:
             from app.models.billing import SubscriptionStatus
-            billing_repo.update_subscription(
+            await run_in_threadpool(
+                billing_repo.update_subscription,
                 str(subscription.id),
                 {
                     "status": SubscriptionStatus.CANCELED,
@@ -1,20 +1,28 @@
+"""
+Dashboard statistics for vouchers, ledger entries and OCR jobs
+
+Responses are cached per process for a short TTL. Voucher and ledger write
+handlers call invalidate_dashboard_cache, which only clears this process's
+cache; other workers serve their copy until it expires.
+"""
+
 from fastapi import APIRouter, HTTPException, Query
-from pymongo import MongoClient
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pymongo import ASCENDING, DESCENDING
 from bson import ObjectId
-from dotenv import load_dotenv
-import os
-import certifi
+import asyncio
+import logging
+import threading
 from datetime import datetime, timedelta
 from typing import Optional
+from cachetools import TTLCache
 
-load_dotenv()
+from app.db import db
 
-router = APIRouter(prefix="/accounting/dashboard", tags=["Dashboard"])
+logger = logging.getLogger(__name__)
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
+router = APIRouter(prefix="/accounting/dashboard", tags=["Dashboard"])
 
 # Collections
 voucher_collection = db["voucher"]
@@ -22,6 +30,168 @@ ledger_collection = db["ledger"]
 ocr_jobs_collection = db["ocr_jobs"]
 users_collection = db["users"]
 
+# Rolling windows for the stats period filter ('today' starts at midnight UTC)
+PERIOD_DELTAS = {
+    "week": timedelta(days=7),
+    "month": timedelta(days=30),
+    "year": timedelta(days=365),
+}
+
+# Dashboards are polled; serve repeats from a short-lived per-process cache
+DASHBOARD_CACHE_TTL_SECONDS = 30
+_dashboard_cache = TTLCache(maxsize=1024, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+_dashboard_cache_lock = threading.Lock()
+
+
+def _create_indexes():
+    """Create indexes backing the dashboard queries"""
+    try:
+        voucher_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        voucher_collection.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+        voucher_collection.create_index([("user_id", ASCENDING), ("rejection_count", ASCENDING)])
+        ledger_collection.create_index([("user_id", ASCENDING), ("processing_status", ASCENDING)])
+        ocr_jobs_collection.create_index([("user_id", ASCENDING), ("status", ASCENDING)])
+    except Exception as e:
+        logger.error(f"Error creating dashboard indexes: {e}")
+
+
+_create_indexes()
+
+
+def invalidate_dashboard_cache(user_id):
+    """Drop cached dashboard responses for a user after their data changes"""
+    with _dashboard_cache_lock:
+        for key in [key for key in _dashboard_cache if key[1] == user_id]:
+            _dashboard_cache.pop(key, None)
+
+
+def _bucket_counts(buckets):
+    """Turn $group {_id, count} buckets into a {value: count} dict"""
+    return {bucket["_id"]: bucket["count"] for bucket in buckets}
+
+
+def _facet_count(branch):
+    """Read a {"$count": "count"} facet branch, which is empty when nothing matched"""
+    return branch[0]["count"] if branch else 0
+
+
+def _bucket_rate(buckets, value):
+    """Share of $total in the {_id, count} bucket for value, as a 2 dp percentage"""
+    bucket_count = {"$sum": {"$map": {
+        "input": {"$filter": {"input": buckets, "cond": {"$eq": ["$$this._id", value]}}},
+        "in": "$$this.count"
+    }}}
+    return {"$cond": [
+        {"$gt": ["$total", 0]},
+        {"$round": [{"$multiply": [{"$divide": [bucket_count, "$total"]}, 100]}, 2]},
+        0
+    ]}
+
+
+# ===== Dashboard Queries =====
+
+def _voucher_facet(query):
+    """Voucher total plus status, OCR, transaction type and category buckets"""
+    return next(voucher_collection.aggregate([
+        {"$match": query},
+        {"$project": {"status": 1, "OCR": 1, "transaction_type": 1, "category": 1}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "ocr": [{"$group": {"_id": "$OCR", "count": {"$sum": 1}}}],
+            "transaction_type": [{"$group": {"_id": "$transaction_type", "count": {"$sum": 1}}}],
+            "categories": [
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+                {"$sort": {"count": -1}},
+                {"$limit": 10}
+            ]
+        }},
+        {"$addFields": {"total": {"$ifNull": [{"$arrayElemAt": ["$total.count", 0]}, 0]}}},
+        {"$addFields": {
+            "approval_rate": _bucket_rate("$status", "approved"),
+            "success_rate": _bucket_rate("$ocr", "done")
+        }}
+    ]))
+
+
+def _recent_vouchers(query):
+    """Last 5 vouchers"""
+    cursor = voucher_collection.find(
+        query,
+        {"_id": 1, "status": 1, "OCR": 1, "created_at": 1, "title": 1, "transaction_type": 1}
+    ).sort("created_at", -1).limit(5)
+    
+    # isoformat(sep=" ", timespec="seconds") gives the same text as "%Y-%m-%d %H:%M:%S"
+    return [
+        {
+            **voucher,
+            "_id": str(voucher["_id"]),
+            **({"created_at": voucher["created_at"].isoformat(sep=" ", timespec="seconds")}
+               if "created_at" in voucher else {})
+        }
+        for voucher in cursor
+    ]
+
+
+def _ledger_facet(query):
+    """Ledger processing status buckets and financial totals"""
+    return next(ledger_collection.aggregate([
+        {"$match": query},
+        {"$project": {
+            "processing_status": 1,
+            "invoice_data.totals.Total_with_Tax": 1,
+            "invoice_data.totals.VAT_amount": 1
+        }},
+        {"$facet": {
+            "processing_status": [{"$group": {"_id": "$processing_status", "count": {"$sum": 1}}}],
+            "financial": [{"$group": {
+                "_id": None,
+                "total_amount": {"$sum": {"$ifNull": ["$invoice_data.totals.Total_with_Tax", 0]}},
+                "total_vat": {"$sum": {"$ifNull": ["$invoice_data.totals.VAT_amount", 0]}},
+                "invoice_count": {"$sum": {"$cond": [{"$ifNull": ["$invoice_data.totals", False]}, 1, 0]}}
+            }}]
+        }}
+    ]))
+
+
+def _rejection_stats(query):
+    """Total rejections and number of rejected-at-least-once vouchers"""
+    return next(voucher_collection.aggregate([
+        {"$match": {**query, "rejection_count": {"$gt": 0}}},
+        {"$group": {"_id": None, "total": {"$sum": "$rejection_count"}, "count": {"$sum": 1}}}
+    ]), {"total": 0, "count": 0})
+
+
+def _quick_summary_facet(user_id, start_of_day):
+    """Header counts for the quick summary"""
+    return next(voucher_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$facet": {
+            "total": [{"$count": "count"}],
+            "pending_approval": [{"$match": {"status": "awaiting_approval"}}, {"$count": "count"}],
+            "approved_today": [
+                {"$match": {"status": "approved", "approved_at": {"$gte": start_of_day}}},
+                {"$count": "count"}
+            ],
+            "ocr_in_progress": [{"$match": {"OCR": "processing"}}, {"$count": "count"}]
+        }}
+    ]))
+
+
+def _ocr_job_stats(user_id):
+    """OCR job counts by status"""
+    status_counts = _bucket_counts(ocr_jobs_collection.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ]))
+    
+    return {
+        "total_jobs": sum(status_counts.values()),
+        "successful": status_counts.get("success", 0),
+        "failed": status_counts.get("failed", 0),
+        "awaiting": status_counts.get("awaiting", 0)
+    }
+
 
 @router.get("/stats/{user_id}")
 async def get_dashboard_stats(
@@ -32,128 +202,94 @@ async def get_dashboard_stats(
     Get comprehensive dashboard statistics for a user.
     Example: GET /accounting/dashboard/stats/6904a8e4fbb19569d323c78c?period=month
     """
+    cache_key = ("stats", user_id, period)
+    with _dashboard_cache_lock:
+        cached = _dashboard_cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
         # Calculate date range based on period
         now = datetime.utcnow()
         date_filter = {}
         
         if period == "today":
-            start_of_day = datetime(now.year, now.month, now.day)
-            date_filter = {"created_at": {"$gte": start_of_day}}
-        elif period == "week":
-            start_of_week = now - timedelta(days=7)
-            date_filter = {"created_at": {"$gte": start_of_week}}
-        elif period == "month":
-            start_of_month = now - timedelta(days=30)
-            date_filter = {"created_at": {"$gte": start_of_month}}
-        elif period == "year":
-            start_of_year = now - timedelta(days=365)
-            date_filter = {"created_at": {"$gte": start_of_year}}
+            date_filter = {"created_at": {"$gte": datetime(now.year, now.month, now.day)}}
+        elif period in PERIOD_DELTAS:
+            date_filter = {"created_at": {"$gte": now - PERIOD_DELTAS[period]}}
         # 'all' means no date filter
         
         # Base query for user
         base_query = {"user_id": user_id}
         query_with_date = {**base_query, **date_filter}
         
-        # 1. Voucher Statistics
-        total_vouchers = voucher_collection.count_documents(query_with_date)
-        pending_vouchers = voucher_collection.count_documents({**query_with_date, "status": "pending"})
-        awaiting_approval = voucher_collection.count_documents({**query_with_date, "status": "awaiting_approval"})
-        approved_vouchers = voucher_collection.count_documents({**query_with_date, "status": "approved"})
-        rejected_vouchers = voucher_collection.count_documents({**query_with_date, "status": "rejected"})
-        
-        # 2. OCR Statistics
-        ocr_pending = voucher_collection.count_documents({**query_with_date, "OCR": "pending"})
-        ocr_processing = voucher_collection.count_documents({**query_with_date, "OCR": "processing"})
-        ocr_done = voucher_collection.count_documents({**query_with_date, "OCR": "done"})
-        ocr_failed = voucher_collection.count_documents({**query_with_date, "OCR": "failed"})
-        ocr_partial = voucher_collection.count_documents({**query_with_date, "OCR": "partial"})
-        
-        # 3. Transaction Type Statistics
-        credit_transactions = voucher_collection.count_documents({**query_with_date, "transaction_type": "credit"})
-        debit_transactions = voucher_collection.count_documents({**query_with_date, "transaction_type": "debit"})
-        
-        # 4. Recent Activity - Last 5 vouchers
-        recent_vouchers = list(voucher_collection.find(
-            base_query,
-            {"_id": 1, "status": 1, "OCR": 1, "created_at": 1, "title": 1, "transaction_type": 1}
-        ).sort("created_at", -1).limit(5))
-        
-        for voucher in recent_vouchers:
-            voucher["_id"] = str(voucher["_id"])
-            if "created_at" in voucher:
-                voucher["created_at"] = voucher["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+        # The queries are independent, so run them concurrently
+        (
+            voucher_facet,
+            recent_vouchers,
+            ledger_facet,
+            rejections,
+            ocr_job_stats
+        ) = await asyncio.gather(
+            run_in_threadpool(_voucher_facet, query_with_date),
+            run_in_threadpool(_recent_vouchers, base_query),
+            run_in_threadpool(_ledger_facet, base_query),
+            run_in_threadpool(_rejection_stats, base_query),
+            run_in_threadpool(_ocr_job_stats, user_id)
+        )
+        
+        # 1-3. Voucher, OCR and transaction type statistics
+        total_vouchers = voucher_facet["total"]
+        status_counts = _bucket_counts(voucher_facet["status"])
+        ocr_counts = _bucket_counts(voucher_facet["ocr"])
+        transaction_counts = _bucket_counts(voucher_facet["transaction_type"])
+        
+        credit_transactions = transaction_counts.get("credit", 0)
+        debit_transactions = transaction_counts.get("debit", 0)
         
         # 5. Ledger Statistics
-        total_ledger_entries = ledger_collection.count_documents(base_query)
-        successful_ocr = ledger_collection.count_documents({**base_query, "processing_status": "success"})
-        failed_ocr = ledger_collection.count_documents({**base_query, "processing_status": "llm_failed"})
+        processing_counts = _bucket_counts(ledger_facet["processing_status"])
+        total_ledger_entries = sum(processing_counts.values())
         
         # 6. Financial Summary from Ledger
-        ledger_entries = list(ledger_collection.find(
-            base_query,
-            {"invoice_data": 1}
-        ))
-        
-        total_amount = 0
-        total_vat = 0
-        invoice_count = 0
-        
-        for entry in ledger_entries:
-            if entry.get("invoice_data") and entry["invoice_data"].get("totals"):
-                totals = entry["invoice_data"]["totals"]
-                if totals.get("Total_with_Tax"):
-                    total_amount += totals["Total_with_Tax"]
-                if totals.get("VAT_amount"):
-                    total_vat += totals["VAT_amount"]
-                invoice_count += 1
+        financial = ledger_facet["financial"][0] if ledger_facet["financial"] else {}
+        total_amount = financial.get("total_amount", 0)
+        total_vat = financial.get("total_vat", 0)
+        invoice_count = financial.get("invoice_count", 0)
         
         # 7. Rejection Statistics
-        vouchers_with_rejections = list(voucher_collection.find(
-            {**base_query, "rejection_count": {"$exists": True, "$gt": 0}},
-            {"rejection_count": 1}
-        ))
-        
-        total_rejections = sum(v.get("rejection_count", 0) for v in vouchers_with_rejections)
-        avg_rejections = total_rejections / len(vouchers_with_rejections) if vouchers_with_rejections else 0
+        total_rejections = rejections["total"]
+        vouchers_with_rejections = rejections["count"]
+        avg_rejections = total_rejections / vouchers_with_rejections if vouchers_with_rejections else 0
         
         # 8. Category Breakdown
-        categories = voucher_collection.aggregate([
-            {"$match": query_with_date},
-            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 10}
-        ])
-        category_breakdown = [{"category": cat["_id"] or "Uncategorized", "count": cat["count"]} for cat in categories]
-        
-        # 9. OCR Job Statistics
-        total_ocr_jobs = ocr_jobs_collection.count_documents({"user_id": user_id})
-        successful_jobs = ocr_jobs_collection.count_documents({"user_id": user_id, "status": "success"})
-        failed_jobs = ocr_jobs_collection.count_documents({"user_id": user_id, "status": "failed"})
-        awaiting_jobs = ocr_jobs_collection.count_documents({"user_id": user_id, "status": "awaiting"})
+        category_breakdown = [
+            {"category": cat["_id"] or "Uncategorized", "count": cat["count"]}
+            for cat in voucher_facet["categories"]
+        ]
         
         # Build response
-        return {
+        stats = {
             "user_id": user_id,
             "period": period,
             "generated_at": now.strftime("%Y-%m-%d %H:%M:%S"),
             
             "voucher_stats": {
                 "total": total_vouchers,
-                "pending": pending_vouchers,
-                "awaiting_approval": awaiting_approval,
-                "approved": approved_vouchers,
-                "rejected": rejected_vouchers,
-                "approval_rate": round((approved_vouchers / total_vouchers * 100) if total_vouchers > 0 else 0, 2)
+                "pending": status_counts.get("pending", 0),
+                "awaiting_approval": status_counts.get("awaiting_approval", 0),
+                "approved": status_counts.get("approved", 0),
+                "rejected": status_counts.get("rejected", 0),
+                "approval_rate": voucher_facet["approval_rate"]
             },
             
             "ocr_stats": {
-                "pending": ocr_pending,
-                "processing": ocr_processing,
-                "done": ocr_done,
-                "failed": ocr_failed,
-                "partial": ocr_partial,
-                "success_rate": round((ocr_done / total_vouchers * 100) if total_vouchers > 0 else 0, 2)
+                "pending": ocr_counts.get("pending", 0),
+                "processing": ocr_counts.get("processing", 0),
+                "done": ocr_counts.get("done", 0),
+                "failed": ocr_counts.get("failed", 0),
+                "partial": ocr_counts.get("partial", 0),
+                "success_rate": voucher_facet["success_rate"]
             },
             
             "transaction_stats": {
@@ -171,28 +307,27 @@ async def get_dashboard_stats(
             
             "rejection_stats": {
                 "total_rejections": total_rejections,
-                "vouchers_with_rejections": len(vouchers_with_rejections),
+                "vouchers_with_rejections": vouchers_with_rejections,
                 "average_rejections_per_voucher": round(avg_rejections, 2)
             },
             
             "ledger_stats": {
                 "total_entries": total_ledger_entries,
-                "successful_ocr": successful_ocr,
-                "failed_ocr": failed_ocr
+                "successful_ocr": processing_counts.get("success", 0),
+                "failed_ocr": processing_counts.get("llm_failed", 0)
             },
             
-            "ocr_job_stats": {
-                "total_jobs": total_ocr_jobs,
-                "successful": successful_jobs,
-                "failed": failed_jobs,
-                "awaiting": awaiting_jobs
-            },
+            "ocr_job_stats": ocr_job_stats,
             
             "category_breakdown": category_breakdown,
             
             "recent_activity": recent_vouchers
         }
         
+        with _dashboard_cache_lock:
+            _dashboard_cache[cache_key] = stats
+        return ORJSONResponse(stats)
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching dashboard stats: {str(e)}")
 
@@ -203,19 +338,25 @@ async def get_quick_summary(user_id: str):
     Get a quick summary for dashboard header/overview.
     Example: GET /accounting/dashboard/summary/6904a8e4fbb19569d323c78c
     """
+    cache_key = ("summary", user_id)
+    with _dashboard_cache_lock:
+        cached = _dashboard_cache.get(cache_key)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     try:
-        # Quick counts
-        total_vouchers = voucher_collection.count_documents({"user_id": user_id})
-        pending_approval = voucher_collection.count_documents({"user_id": user_id, "status": "awaiting_approval"})
-        approved_today = voucher_collection.count_documents({
-            "user_id": user_id,
-            "status": "approved",
-            "approved_at": {"$gte": datetime(datetime.utcnow().year, datetime.utcnow().month, datetime.utcnow().day)}
-        })
+        # Quick counts in a single pass
+        now = datetime.utcnow()
+        start_of_day = datetime(now.year, now.month, now.day)
         
-        ocr_in_progress = voucher_collection.count_documents({"user_id": user_id, "OCR": "processing"})
+        counts = await run_in_threadpool(_quick_summary_facet, user_id, start_of_day)
         
-        return {
+        total_vouchers = _facet_count(counts["total"])
+        pending_approval = _facet_count(counts["pending_approval"])
+        approved_today = _facet_count(counts["approved_today"])
+        ocr_in_progress = _facet_count(counts["ocr_in_progress"])
+        
+        summary = {
             "user_id": user_id,
             "total_vouchers": total_vouchers,
             "pending_approval": pending_approval,
@@ -223,5 +364,9 @@ async def get_quick_summary(user_id: str):
             "ocr_in_progress": ocr_in_progress
         }
         
+        with _dashboard_cache_lock:
+            _dashboard_cache[cache_key] = summary
+        return ORJSONResponse(summary)
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching summary: {str(e)}")
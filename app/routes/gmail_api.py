@@ -1,21 +1,25 @@
 from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse, RedirectResponse
 from typing import Optional, List, Dict, Any
 from pydantic import BaseModel, Field
 from datetime import datetime
+from functools import lru_cache
+from collections import defaultdict
 import os
 import sys
+import logging
 from google_auth_oauthlib.flow import Flow
-from pymongo import MongoClient
 from bson import ObjectId
-from dotenv import load_dotenv
 
 # Add the parent directory to the path to import services
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-load_dotenv()
+from app.db import db  # also loads .env before the settings below are read
 
 from services.gmail_service import GmailService
 
+logger = logging.getLogger(__name__)
+
 # Mount under "/api" in main; this keeps routes at "/api/gmail"
 router = APIRouter(prefix="/gmail", tags=["Gmail"])
 
@@ -65,10 +69,17 @@ class EmailFilter(BaseModel):
     purchase_type: Optional[str] = None
 
 # --- Database Connection ---
-db_client = MongoClient(os.getenv("MONGO_URI"))
-db = db_client[os.getenv("DB_NAME")]
 users_collection = db["users"]
 
+# Gmail routes only need the stored OAuth credentials from the user document
+GMAIL_CREDENTIALS_PROJECTION = {"gmail_credentials": 1}
+
+try:
+    # OAuth callbacks look the user up by the state issued at authorize time
+    users_collection.create_index("oauth_state")
+except Exception as e:
+    logger.error(f"Error creating oauth_state index: {e}")
+
 # --- OAuth2 Flow Settings ---
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.readonly',
@@ -87,7 +98,12 @@ GMAIL_AUTH_URI = os.getenv("GMAIL_AUTH_URI", "https://accounts.google.com/o/oaut
 GMAIL_TOKEN_URI = os.getenv("GMAIL_TOKEN_URI", "https://oauth2.googleapis.com/token")
 GMAIL_CERT_URL = os.getenv("GMAIL_CERT_URL", "https://www.googleapis.com/oauth2/v1/certs")
 
+# Emails fetched by /purchases/filter before the amount/merchant/type checks
+FILTER_MAX_RESULTS = 200
+
+@lru_cache(maxsize=1)
 def _build_google_client_config():
+    # Settings are module constants; a missing secret raises and isn't cached
     if not GMAIL_CLIENT_ID or not GMAIL_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="Missing GMAIL_CLIENT_ID or GMAIL_CLIENT_SECRET in environment")
     return {
@@ -108,7 +124,7 @@ async def authenticate_gmail(user_id: str = Query(..., description="User ID to t
     Returns authentication status and auth URL if needed
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             return AuthResponse(
                 success=False,
@@ -178,7 +194,7 @@ async def oauth2_callback(code: str, state: str):
     """
     try:
         # Find user by state to prevent CSRF
-        user = users_collection.find_one({"oauth_state": state})
+        user = users_collection.find_one({"oauth_state": state}, {"oauth_requested_scopes": 1})
         if not user:
             raise HTTPException(status_code=400, detail="Invalid OAuth state")
 
@@ -235,13 +251,14 @@ async def get_purchase_emails(
     - Purchase type classification
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             raise HTTPException(status_code=401, detail="Gmail not authorized for this user")
 
         gmail_service = GmailService(user_credentials=user["gmail_credentials"])
         
-        result = gmail_service.get_purchase_emails(
+        result = await run_in_threadpool(
+            gmail_service.get_purchase_emails,
             max_results=max_results,
             page_token=page_token
         )
@@ -274,12 +291,13 @@ async def search_emails(user_id: str, search_request: SearchRequest):
     - `category:purchases` - emails in purchases category
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             raise HTTPException(status_code=401, detail="Gmail not authorized for this user")
 
         gmail_service = GmailService(user_credentials=user["gmail_credentials"])
-        result = gmail_service.search_emails(
+        result = await run_in_threadpool(
+            gmail_service.search_emails,
             query=search_request.query,
             max_results=search_request.max_results
         )
@@ -310,7 +328,7 @@ async def filter_purchase_emails(user_id: str, email_filter: EmailFilter):
     - **purchase_type**: Filter by purchase type
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             raise HTTPException(status_code=401, detail="Gmail not authorized for this user")
 
@@ -326,10 +344,15 @@ async def filter_purchase_emails(user_id: str, email_filter: EmailFilter):
             query_parts.append(f"after:{email_filter.date_from.replace('-', '/')}")
         if email_filter.date_to:
             query_parts.append(f"before:{email_filter.date_to.replace('-', '/')}")
+        # Narrow by merchant in Gmail; the exact check below still applies
+        if email_filter.merchant:
+            query_parts.append(f'from:"{email_filter.merchant}"')
         
         query = " ".join(query_parts)
         
-        result = gmail_service.search_emails(query=query, max_results=100) # Limit filter results
+        result = await run_in_threadpool(
+            gmail_service.search_emails, query=query, max_results=FILTER_MAX_RESULTS
+        )
         
         # Further filter by fields not supported in Gmail query
         filtered_emails = result['emails']
@@ -351,6 +374,10 @@ async def filter_purchase_emails(user_id: str, email_filter: EmailFilter):
         raise HTTPException(status_code=500, detail=f"Error filtering emails: {str(e)}")
 
 
+def _new_summary_bucket():
+    return {'total_amount': 0, 'count': 0}
+
+
 @router.get("/purchases/summary")
 async def get_purchase_summary(user_id: str):
     """
@@ -359,37 +386,35 @@ async def get_purchase_summary(user_id: str):
     - **user_id**: The ID of the user to get the summary for
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             raise HTTPException(status_code=401, detail="Gmail not authorized for this user")
 
         gmail_service = GmailService(user_credentials=user["gmail_credentials"])
         
-        all_emails = gmail_service.get_all_purchase_emails()
+        all_emails = await run_in_threadpool(gmail_service.get_all_purchase_emails)
         
-        summary = {
-            "by_merchant": {},
-            "by_purchase_type": {}
-        }
+        by_merchant = defaultdict(_new_summary_bucket)
+        by_purchase_type = defaultdict(_new_summary_bucket)
         
         for email in all_emails:
-            merchant = email.get('merchant', 'Unknown')
-            purchase_type = email.get('purchase_type', 'unknown')
-            amount = email.get('amount', 0)
+            # Parsed emails carry these keys with None when nothing was extracted
+            amount = email.get('amount') or 0
             
             # Summary by merchant
-            if merchant not in summary['by_merchant']:
-                summary['by_merchant'][merchant] = {'total_amount': 0, 'count': 0}
-            summary['by_merchant'][merchant]['total_amount'] += amount
-            summary['by_merchant'][merchant]['count'] += 1
+            bucket = by_merchant[email.get('merchant') or 'Unknown']
+            bucket['total_amount'] += amount
+            bucket['count'] += 1
             
             # Summary by purchase type
-            if purchase_type not in summary['by_purchase_type']:
-                summary['by_purchase_type'][purchase_type] = {'total_amount': 0, 'count': 0}
-            summary['by_purchase_type'][purchase_type]['total_amount'] += amount
-            summary['by_purchase_type'][purchase_type]['count'] += 1
+            bucket = by_purchase_type[email.get('purchase_type') or 'unknown']
+            bucket['total_amount'] += amount
+            bucket['count'] += 1
             
-        return summary
+        return {
+            "by_merchant": by_merchant,
+            "by_purchase_type": by_purchase_type
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
@@ -404,7 +429,7 @@ async def get_email_details(user_id: str, email_id: str):
     - **email_id**: The ID of the email to fetch
     """
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, GMAIL_CREDENTIALS_PROJECTION)
         if not user or not user.get("gmail_credentials"):
             raise HTTPException(status_code=401, detail="Gmail not authorized for this user")
 
@@ -1,24 +1,25 @@
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query, Form
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field, validator
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING, InsertOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from bson import ObjectId
-from dotenv import load_dotenv
-import os
-import certifi
+from bson.decimal128 import Decimal128
+import logging
 from datetime import datetime, date
 from decimal import Decimal
 from enum import Enum
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 
-# Load env variables
-load_dotenv()
+from app.db import client, db
+from app.routes.dashboard import invalidate_dashboard_cache
 
-router = APIRouter(prefix="/accounting/ledger", tags=["ledger"])
+logger = logging.getLogger(__name__)
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
+router = APIRouter(prefix="/accounting/ledger", tags=["ledger"])
 
 # Collections
 voucher_collection = db["voucher"]
@@ -26,6 +27,51 @@ journal_entries_collection = db["journal_entries"]
 chart_of_accounts_collection = db["chart_of_accounts"]
 ledger_collection = db["ledger"]
 accruals_collection = db["accruals"]
+counters_collection = db["counters"]
+
+
+def _create_indexes():
+    """Create indexes backing the ledger queries"""
+    try:
+        # One active account per code; any number of deactivated rows may share it.
+        # Replaces the earlier unique (account_code, is_active) index, which allowed
+        # only one inactive row per code
+        try:
+            chart_of_accounts_collection.drop_index("account_code_1_is_active_1")
+        except OperationFailure:
+            pass
+        chart_of_accounts_collection.create_index(
+            [("account_code", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"is_active": True}
+        )
+        chart_of_accounts_collection.create_index(
+            [("account_type", ASCENDING), ("is_active", ASCENDING), ("account_code", ASCENDING)]
+        )
+        chart_of_accounts_collection.create_index([("is_active", ASCENDING), ("account_code", ASCENDING)])
+        ledger_collection.create_index([("account_code", ASCENDING), ("transaction_date", DESCENDING)])
+        ledger_collection.create_index([("transaction_date", DESCENDING)])
+        ledger_collection.create_index([("voucher_id", ASCENDING)])
+        ledger_collection.create_index([("journal_entry_id", ASCENDING)])
+        # One ledger posting per voucher; only post_voucher_to_ledger sets posted_voucher_id,
+        # so manual entries and the accounting module's voucher lines are exempt
+        journal_entries_collection.create_index(
+            [("posted_voucher_id", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"posted_voucher_id": {"$type": "string"}}
+        )
+        accruals_collection.create_index([("accrual_date", ASCENDING), ("status", ASCENDING)])
+        # Bank postings and accounting-module vouchers share the collection without a reference_number
+        journal_entries_collection.create_index(
+            [("reference_number", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"reference_number": {"$type": "string"}}
+        )
+    except Exception as e:
+        logger.error(f"Error creating ledger indexes: {e}")
+
+
+_create_indexes()
 
 # ==================== ENUMS ====================
 
@@ -45,6 +91,18 @@ class JournalEntryStatus(str, Enum):
     POSTED = "posted"
     REVERSED = "reversed"
 
+# Money is kept to the cent
+CENT = Decimal("0.01")
+
+# Account types with a normal debit balance; the others are normally credits
+DEBIT_NORMAL_ACCOUNT_TYPES = [AccountType.ASSET.value, AccountType.EXPENSE.value]
+
+# Chart of accounts fields returned by the listing
+ACCOUNT_LIST_PROJECTION = {
+    "account_code": 1, "account_name": 1, "account_type": 1,
+    "parent_account": 1, "is_active": 1, "description": 1
+}
+
 # ==================== PYDANTIC MODELS ====================
 
 class Account(BaseModel):
@@ -59,7 +117,7 @@ class LedgerEntry(BaseModel):
     account_code: str = Field(..., description="Account code")
     account_name: str = Field(..., description="Account name")
     entry_type: EntryType = Field(..., description="Debit or Credit")
-    amount: float = Field(..., gt=0, description="Entry amount (must be positive)")
+    amount: Decimal = Field(..., gt=0, description="Entry amount (must be positive)")
     description: Optional[str] = Field(None, description="Entry description")
     modelo_id: Optional[str] = Field(None, description="Optional modelo _id reference")
 
@@ -67,7 +125,7 @@ class LedgerEntry(BaseModel):
     def validate_amount(cls, v):
         if v <= 0:
             raise ValueError('Amount must be positive')
-        return round(v, 2)
+        return v.quantize(CENT)
 
 class JournalEntryCreate(BaseModel):
     reference_number: Optional[str] = Field(None, description="Reference number (auto-generated if not provided)")
@@ -81,10 +139,15 @@ class JournalEntryCreate(BaseModel):
         if len(v) < 2:
             raise ValueError('At least 2 entries required for double-entry bookkeeping')
         
-        total_debits = sum(entry.amount for entry in v if entry.entry_type == EntryType.DEBIT)
-        total_credits = sum(entry.amount for entry in v if entry.entry_type == EntryType.CREDIT)
+        total_debits = Decimal(0)
+        total_credits = Decimal(0)
+        for entry in v:
+            if entry.entry_type == EntryType.DEBIT:
+                total_debits += entry.amount
+            else:
+                total_credits += entry.amount
         
-        if abs(total_debits - total_credits) > 0.01:  # Allow for small rounding differences
+        if total_debits != total_credits:
             raise ValueError(f'Debits ({total_debits}) must equal Credits ({total_credits})')
         
         return v
@@ -97,7 +160,7 @@ class JournalEntry(BaseModel):
     description: str
     entries: List[LedgerEntry]
     status: JournalEntryStatus = JournalEntryStatus.DRAFT
-    total_amount: float
+    total_amount: Decimal
     created_by: Optional[str] = None
     created_at: datetime
     posted_at: Optional[datetime] = None
@@ -112,11 +175,14 @@ class VoucherPostingRequest(BaseModel):
 
 class AccrualRequest(BaseModel):
     account_code: str = Field(..., description="Account code for accrual")
-    amount: float = Field(..., gt=0, description="Accrual amount")
+    amount: Decimal = Field(..., gt=0, description="Accrual amount")
     accrual_date: date = Field(..., description="Date when accrual should be posted")
     reversal_date: date = Field(..., description="Date when accrual should be reversed")
     description: str = Field(..., description="Accrual description")
 
+class BulkAccrualRequest(BaseModel):
+    items: List[AccrualRequest] = Field(..., min_items=1, description="Accruals to schedule")
+
 class LedgerFilter(BaseModel):
     account_code: Optional[str] = None
     account_type: Optional[AccountType] = None
@@ -126,27 +192,77 @@ class LedgerFilter(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+def to_decimal128(amount: Decimal) -> Decimal128:
+    """Store money as Decimal128 so Mongo keeps and sums it exactly"""
+    return Decimal128(str(amount))
+
+def to_decimal(value) -> Decimal:
+    """Read a stored amount (Decimal128, or a float on older documents) as Decimal"""
+    if isinstance(value, Decimal128):
+        return value.to_decimal()
+    return Decimal(str(value))
+
+def entry_document(entry: LedgerEntry, account_name: Optional[str] = None) -> Dict[str, Any]:
+    """Journal entry line as stored in Mongo, optionally with the account name from the chart"""
+    return {
+        "account_code": entry.account_code,
+        "account_name": account_name or entry.account_name,
+        "entry_type": entry.entry_type.value,
+        "amount": to_decimal128(entry.amount),
+        "description": entry.description,
+        "modelo_id": entry.modelo_id
+    }
+
+# Active accounts by code; the chart of accounts rarely changes, so lookups
+# are served from here for a minute (misses are not cached)
+ACCOUNT_CACHE_TTL_SECONDS = 60
+_account_cache = TTLCache(maxsize=4096, ttl=ACCOUNT_CACHE_TTL_SECONDS)
+_account_cache_lock = threading.Lock()
+
+# Runs ledger list counts alongside the page query
+_count_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ledger-count")
+
 def generate_reference_number() -> str:
-    """Generate unique reference number for journal entries"""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    return f"JE{timestamp}"
-
-def validate_account_exists(account_code: str) -> bool:
-    """Check if account exists in chart of accounts"""
-    account = chart_of_accounts_collection.find_one({"account_code": account_code, "is_active": True})
-    return account is not None
-
-def get_account_info(account_code: str) -> Dict[str, Any]:
-    """Get account information"""
-    account = chart_of_accounts_collection.find_one({"account_code": account_code})
-    if not account:
-        raise HTTPException(status_code=404, detail=f"Account {account_code} not found")
-    return account
+    """Generate unique reference number for journal entries from an atomic counter"""
+    counter = counters_collection.find_one_and_update(
+        {"_id": "je_seq"},
+        {"$inc": {"n": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return f"JE{datetime.utcnow():%Y%m%d}{counter['n']:08d}"
+
+def get_accounts_info(account_codes) -> Dict[str, Dict[str, Any]]:
+    """
+    Get active accounts by code in a single query, keyed by account_code.
+    Raises 400 listing any codes missing from the chart of accounts.
+    """
+    codes = set(account_codes)
+    with _account_cache_lock:
+        accounts = {code: _account_cache[code] for code in codes if code in _account_cache}
+    
+    uncached = codes - accounts.keys()
+    if uncached:
+        fetched = {
+            account["account_code"]: account
+            for account in chart_of_accounts_collection.find(
+                {"account_code": {"$in": list(uncached)}, "is_active": True},
+                {"account_code": 1, "account_name": 1, "account_type": 1}
+            )
+        }
+        with _account_cache_lock:
+            _account_cache.update(fetched)
+        accounts.update(fetched)
+    
+    missing = sorted(codes - accounts.keys())
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Account(s) {', '.join(missing)} not found")
+    return accounts
 
 # ==================== API ENDPOINTS ====================
 
 @router.post("/post")
-async def post_voucher_to_ledger(
+def post_voucher_to_ledger(
     posting_request: VoucherPostingRequest,
     user_id: str = Query(..., description="User ID posting the entry")
 ):
@@ -163,102 +279,74 @@ async def post_voucher_to_ledger(
         if voucher.get("status") != "approved":
             raise HTTPException(status_code=400, detail="Only approved vouchers can be posted to ledger")
         
-        # Check if already posted
-        existing_entry = journal_entries_collection.find_one({"voucher_id": posting_request.voucher_id})
-        if existing_entry:
-            raise HTTPException(status_code=400, detail="Voucher already posted to ledger")
-        
         # 2. Extract financial data from voucher (assuming OCR data contains amounts)
         ocr_data = db["ocr"].find_one({"voucher_id": posting_request.voucher_id})
         if not ocr_data:
             raise HTTPException(status_code=400, detail="No OCR data found for voucher")
         
         # Parse amounts from OCR data (this would need to be customized based on your OCR structure)
-        total_amount = float(ocr_data.get("total_amount", 0))
+        total_amount = Decimal(str(ocr_data.get("total_amount", 0))).quantize(CENT)
         if total_amount <= 0:
             raise HTTPException(status_code=400, detail="Invalid amount in voucher")
         
-        # 3. Validate account mappings
-        for expense_type, account_code in posting_request.account_mappings.items():
-            if not validate_account_exists(account_code):
-                raise HTTPException(status_code=400, detail=f"Account {account_code} not found")
-        
-        # 4. Create journal entries based on document type
+        # 3. Pick the accounts for the document type
         document_type = voucher.get("document_type", "expense")
-        entries = []
+        expense_account = posting_request.account_mappings.get("expense", "5000")
         
         if document_type == "supplier_invoice":
             # Debit: Expense Account, Credit: Accounts Payable
-            expense_account = posting_request.account_mappings.get("expense", "5000")
-            payable_account = posting_request.account_mappings.get("accounts_payable", "2000")
-            
-            expense_info = get_account_info(expense_account)
-            payable_info = get_account_info(payable_account)
-            
-            entries = [
-                LedgerEntry(
-                    account_code=expense_account,
-                    account_name=expense_info["account_name"],
-                    entry_type=EntryType.DEBIT,
-                    amount=total_amount,
-                    description=f"Expense from voucher {posting_request.voucher_id}"
-                ),
-                LedgerEntry(
-                    account_code=payable_account,
-                    account_name=payable_info["account_name"],
-                    entry_type=EntryType.CREDIT,
-                    amount=total_amount,
-                    description=f"Accounts payable from voucher {posting_request.voucher_id}"
-                )
-            ]
-        
+            credit_account = posting_request.account_mappings.get("accounts_payable", "2000")
+            credit_description = f"Accounts payable from voucher {posting_request.voucher_id}"
         elif document_type == "expense":
             # Debit: Expense Account, Credit: Cash/Bank
-            expense_account = posting_request.account_mappings.get("expense", "5000")
-            cash_account = posting_request.account_mappings.get("cash", "1000")
-            
-            expense_info = get_account_info(expense_account)
-            cash_info = get_account_info(cash_account)
-            
-            entries = [
-                LedgerEntry(
-                    account_code=expense_account,
-                    account_name=expense_info["account_name"],
-                    entry_type=EntryType.DEBIT,
-                    amount=total_amount,
-                    description=f"Expense from voucher {posting_request.voucher_id}"
-                ),
-                LedgerEntry(
-                    account_code=cash_account,
-                    account_name=cash_info["account_name"],
-                    entry_type=EntryType.CREDIT,
-                    amount=total_amount,
-                    description=f"Cash payment from voucher {posting_request.voucher_id}"
-                )
-            ]
-        
+            credit_account = posting_request.account_mappings.get("cash", "1000")
+            credit_description = f"Cash payment from voucher {posting_request.voucher_id}"
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported document type: {document_type}")
         
-        # 5. Create journal entry
+        # 4. Validate the mapped accounts and fetch the ones used in one query
+        accounts = get_accounts_info(
+            {*posting_request.account_mappings.values(), expense_account, credit_account}
+        )
+        
+        entries = [
+            LedgerEntry(
+                account_code=expense_account,
+                account_name=accounts[expense_account]["account_name"],
+                entry_type=EntryType.DEBIT,
+                amount=total_amount,
+                description=f"Expense from voucher {posting_request.voucher_id}"
+            ),
+            LedgerEntry(
+                account_code=credit_account,
+                account_name=accounts[credit_account]["account_name"],
+                entry_type=EntryType.CREDIT,
+                amount=total_amount,
+                description=credit_description
+            )
+        ]
+        
+        # 5. Create journal entry; the _id is assigned client-side so the ledger
+        # rows can reference it before anything reaches the server
+        journal_entry_oid = ObjectId()
+        journal_entry_id = str(journal_entry_oid)
+        now = datetime.utcnow()
         journal_entry_data = {
+            "_id": journal_entry_oid,
             "reference_number": generate_reference_number(),
             "voucher_id": posting_request.voucher_id,
+            "posted_voucher_id": posting_request.voucher_id,
             "transaction_date": datetime.now().date(),
             "description": posting_request.description or f"Auto-posting from voucher {posting_request.voucher_id}",
-            "entries": [entry.dict() for entry in entries],
+            "entries": [entry_document(entry) for entry in entries],
             "status": JournalEntryStatus.POSTED.value,
-            "total_amount": total_amount,
+            "total_amount": to_decimal128(total_amount),
             "created_by": user_id,
-            "created_at": datetime.utcnow(),
-            "posted_at": datetime.utcnow()
+            "created_at": now,
+            "posted_at": now
         }
         
-        # 6. Insert journal entry
-        result = journal_entries_collection.insert_one(journal_entry_data)
-        journal_entry_id = str(result.inserted_id)
-        
-        # 7. Post to ledger (create individual ledger records)
+        # 6. Build the individual ledger records
         ledger_records = []
         for entry in entries:
             ledger_record = {
@@ -268,20 +356,42 @@ async def post_voucher_to_ledger(
                 "account_name": entry.account_name,
                 "transaction_date": journal_entry_data["transaction_date"],
                 "entry_type": entry.entry_type.value,
-                "amount": entry.amount,
+                "amount": to_decimal128(entry.amount),
                 "description": entry.description,
                 "voucher_id": posting_request.voucher_id,
-                "created_at": datetime.utcnow()
+                "created_at": now
             }
             ledger_records.append(ledger_record)
         
-        ledger_collection.insert_many(ledger_records)
-        
-        # 8. Update voucher status
-        voucher_collection.update_one(
-            {"_id": ObjectId(posting_request.voucher_id)},
-            {"$set": {"ledger_status": "posted", "journal_entry_id": journal_entry_id, "posted_at": datetime.utcnow()}}
-        )
+        def _post(session):
+            # 7. Queue the journal entry and its ledger rows; the unique posted_voucher_id
+            # index rejects a second posting
+            journal_entries_collection.insert_one(journal_entry_data, session=session)
+            ledger_collection.bulk_write(
+                [InsertOne(record) for record in ledger_records], ordered=False, session=session
+            )
+            
+            # 8. Update voucher status; vouchers posted before posted_voucher_id existed
+            # are caught here and the whole transaction is rolled back
+            result = voucher_collection.update_one(
+                {"_id": ObjectId(posting_request.voucher_id), "ledger_status": {"$ne": "posted"}},
+                {"$set": {"ledger_status": "posted", "journal_entry_id": journal_entry_id, "posted_at": now}},
+                session=session
+            )
+            if result.matched_count == 0:
+                raise HTTPException(status_code=400, detail="Voucher already posted to ledger")
+        
+        # Steps 7-8 commit together; with_transaction retries transient errors
+        try:
+            with client.start_session() as session:
+                session.with_transaction(_post)
+        except DuplicateKeyError as e:
+            # Only the posted_voucher_id index means a second posting; any other
+            # write error goes to the 500 path below
+            if "posted_voucher_id" not in (e.details or {}).get("keyPattern", {}):
+                raise
+            raise HTTPException(status_code=400, detail="Voucher already posted to ledger")
+        invalidate_dashboard_cache(voucher.get("user_id"))
         
         return {
             "message": "Voucher posted to ledger successfully",
@@ -298,7 +408,7 @@ async def post_voucher_to_ledger(
 
 
 @router.post("/manual")
-async def create_manual_journal_entry(
+def create_manual_journal_entry(
     journal_entry: JournalEntryCreate,
     user_id: str = Query(..., description="User ID creating the entry")
 ):
@@ -308,23 +418,21 @@ async def create_manual_journal_entry(
     """
     try:
         # 1. Validate all accounts exist
-        for entry in journal_entry.entries:
-            if not validate_account_exists(entry.account_code):
-                raise HTTPException(status_code=400, detail=f"Account {entry.account_code} not found")
+        accounts = get_accounts_info(entry.account_code for entry in journal_entry.entries)
         
         # 2. Generate reference number if not provided
         reference_number = journal_entry.reference_number or generate_reference_number()
         
         # 3. Calculate total amount
-        total_amount = sum(entry.amount for entry in journal_entry.entries if entry.entry_type == EntryType.DEBIT)
+        total_amount = sum(
+            (entry.amount for entry in journal_entry.entries if entry.entry_type == EntryType.DEBIT), Decimal(0)
+        )
         
         # 4. Enrich entries with account names
-        enriched_entries = []
-        for entry in journal_entry.entries:
-            account_info = get_account_info(entry.account_code)
-            enriched_entry = entry.dict()
-            enriched_entry["account_name"] = account_info["account_name"]
-            enriched_entries.append(enriched_entry)
+        enriched_entries = [
+            entry_document(entry, accounts[entry.account_code]["account_name"])
+            for entry in journal_entry.entries
+        ]
         
         # 5. Create journal entry document
         journal_entry_data = {
@@ -334,15 +442,19 @@ async def create_manual_journal_entry(
             "description": journal_entry.description,
             "entries": enriched_entries,
             "status": JournalEntryStatus.DRAFT.value,
-            "total_amount": total_amount,
+            "total_amount": to_decimal128(total_amount),
             "created_by": user_id,
             "created_at": datetime.utcnow(),
             "posted_at": None
         }
         
         # 6. Insert journal entry
-        result = journal_entries_collection.insert_one(journal_entry_data)
+        try:
+            result = journal_entries_collection.insert_one(journal_entry_data)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Reference number already has a journal entry")
         journal_entry_id = str(result.inserted_id)
+        invalidate_dashboard_cache(user_id)
         
         return {
             "message": "Manual journal entry created successfully",
@@ -359,7 +471,7 @@ async def create_manual_journal_entry(
 
 
 @router.post("/entries")
-async def create_ledger_entry(
+def create_ledger_entry(
     entry_data: dict,
     user_id: str = Query(..., description="User ID creating the entry")
 ):
@@ -378,6 +490,7 @@ async def create_ledger_entry(
                 raise HTTPException(status_code=404, detail="Modelo not found")
         
         result = ledger_collection.insert_one(entry_data)
+        invalidate_dashboard_cache(entry_data.get("user_id", user_id))
         
         return {
             "message": "Ledger entry created successfully",
@@ -394,7 +507,7 @@ async def create_ledger_entry(
 
 
 @router.put("/entries/{entry_id}/modelo")
-async def update_ledger_modelo(
+def update_ledger_modelo(
     entry_id: str,
     modelo_id: str = Query(..., description="Modelo _id to assign"),
     user_id: str = Query(..., description="User ID")
@@ -447,14 +560,15 @@ async def update_ledger_modelo(
 
 
 @router.get("/")
-async def get_ledger_entries(
+def get_ledger_entries(
     account_code: Optional[str] = Query(None, description="Filter by account code"),
     account_type: Optional[AccountType] = Query(None, description="Filter by account type"),
     start_date: Optional[date] = Query(None, description="Start date filter"),
     end_date: Optional[date] = Query(None, description="End date filter"),
     entry_type: Optional[EntryType] = Query(None, description="Filter by debit/credit"),
     limit: int = Query(100, le=1000, description="Maximum number of records to return"),
-    skip: int = Query(0, ge=0, description="Number of records to skip")
+    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    include_details: bool = Query(True, description="Include voucher_id and description in each entry")
 ):
     """
     View ledger transactions with filtering capabilities.
@@ -479,29 +593,45 @@ async def get_ledger_entries(
         # If filtering by account type, we need to join with chart of accounts
         if account_type:
             # Get all accounts of the specified type
-            accounts = list(chart_of_accounts_collection.find(
-                {"account_type": account_type.value, "is_active": True},
-                {"account_code": 1}
-            ))
-            account_codes = [acc["account_code"] for acc in accounts]
+            account_codes = chart_of_accounts_collection.distinct(
+                "account_code", {"account_type": account_type.value, "is_active": True}
+            )
             query["account_code"] = {"$in": account_codes}
         
-        # Execute query
-        ledger_entries = list(ledger_collection.find(query)
-                            .sort("transaction_date", -1)
-                            .skip(skip)
-                            .limit(limit))
+        # Count on another thread while this one fetches the page; an
+        # unfiltered total comes from collection metadata
+        if query:
+            count_future = _count_executor.submit(ledger_collection.count_documents, query)
+        else:
+            count_future = _count_executor.submit(ledger_collection.estimated_document_count)
+        
+        # Execute query; ids, amounts and dates are converted to their JSON
+        # form on the server so rows go straight to the encoder
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"transaction_date": -1}},
+            {"$skip": skip},
+            {"$limit": limit},
+            {"$addFields": {
+                "_id": {"$toString": "$_id"},
+                "amount": {"$convert": {"input": "$amount", "to": "double", "onError": "$amount", "onNull": "$amount"}},
+                "transaction_date": {"$cond": [
+                    {"$eq": [{"$type": "$transaction_date"}, "date"]},
+                    {"$dateToString": {"format": "%Y-%m-%d", "date": "$transaction_date"}},
+                    "$transaction_date"
+                ]}
+            }}
+        ]
+        if not include_details:
+            pipeline.append({"$project": {"voucher_id": 0, "description": 0}})
+        
+        # One batch holds the whole page, so there are no getMore round trips
+        ledger_entries = list(ledger_collection.aggregate(pipeline, batchSize=limit))
         
         # Get total count
-        total_count = ledger_collection.count_documents(query)
-        
-        # Format response
-        for entry in ledger_entries:
-            entry["_id"] = str(entry["_id"])
-            if isinstance(entry.get("transaction_date"), datetime):
-                entry["transaction_date"] = entry["transaction_date"].date()
+        total_count = count_future.result()
         
-        return {
+        return ORJSONResponse({
             "entries": ledger_entries,
             "total_count": total_count,
             "returned_count": len(ledger_entries),
@@ -512,14 +642,14 @@ async def get_ledger_entries(
                 "end_date": end_date,
                 "entry_type": entry_type
             }
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving ledger entries: {str(e)}")
 
 
 @router.post("/accrual")
-async def create_accrual_entry(
+def create_accrual_entry(
     accrual: AccrualRequest,
     user_id: str = Query(..., description="User ID creating the accrual")
 ):
@@ -529,21 +659,17 @@ async def create_accrual_entry(
     """
     try:
         # 1. Validate account exists
-        if not validate_account_exists(accrual.account_code):
-            raise HTTPException(status_code=400, detail=f"Account {accrual.account_code} not found")
+        account_info = get_accounts_info([accrual.account_code])[accrual.account_code]
         
         # 2. Validate dates
         if accrual.reversal_date <= accrual.accrual_date:
             raise HTTPException(status_code=400, detail="Reversal date must be after accrual date")
         
-        # 3. Get account info
-        account_info = get_account_info(accrual.account_code)
-        
-        # 4. Create accrual record
+        # 3. Create accrual record
         accrual_data = {
             "account_code": accrual.account_code,
             "account_name": account_info["account_name"],
-            "amount": accrual.amount,
+            "amount": to_decimal128(accrual.amount),
             "accrual_date": accrual.accrual_date,
             "reversal_date": accrual.reversal_date,
             "description": accrual.description,
@@ -572,8 +698,66 @@ async def create_accrual_entry(
         raise HTTPException(status_code=500, detail=f"Error creating accrual: {str(e)}")
 
 
+@router.post("/accrual/bulk")
+def create_bulk_accrual_entries(
+    bulk_request: BulkAccrualRequest,
+    user_id: str = Query(..., description="User ID creating the accruals")
+):
+    """
+    Schedule several accrual adjustments in one call.
+    Accounts are validated together and the accruals inserted in one batch.
+    """
+    try:
+        # 1. Validate all accounts exist
+        accounts = get_accounts_info(accrual.account_code for accrual in bulk_request.items)
+        
+        # 2. Validate dates
+        invalid = [
+            index for index, accrual in enumerate(bulk_request.items)
+            if accrual.reversal_date <= accrual.accrual_date
+        ]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Reversal date must be after accrual date (items {', '.join(map(str, invalid))})"
+            )
+        
+        # 3. Create accrual records
+        now = datetime.utcnow()
+        accrual_docs = [
+            {
+                "account_code": accrual.account_code,
+                "account_name": accounts[accrual.account_code]["account_name"],
+                "amount": to_decimal128(accrual.amount),
+                "accrual_date": accrual.accrual_date,
+                "reversal_date": accrual.reversal_date,
+                "description": accrual.description,
+                "status": "scheduled",
+                "created_by": user_id,
+                "created_at": now,
+                "accrual_journal_entry_id": None,
+                "reversal_journal_entry_id": None
+            }
+            for accrual in bulk_request.items
+        ]
+        
+        result = accruals_collection.insert_many(accrual_docs, ordered=False)
+        
+        return {
+            "message": "Accruals scheduled successfully",
+            "accrual_ids": [str(accrual_id) for accrual_id in result.inserted_ids],
+            "count": len(result.inserted_ids),
+            "status": "scheduled"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating accruals: {str(e)}")
+
+
 @router.post("/journal-entry/{journal_entry_id}/post")
-async def post_journal_entry(
+def post_journal_entry(
     journal_entry_id: str,
     user_id: str = Query(..., description="User ID posting the entry")
 ):
@@ -589,13 +773,8 @@ async def post_journal_entry(
         if journal_entry.get("status") != JournalEntryStatus.DRAFT.value:
             raise HTTPException(status_code=400, detail="Only draft entries can be posted")
         
-        # 2. Update journal entry status
-        journal_entries_collection.update_one(
-            {"_id": ObjectId(journal_entry_id)},
-            {"$set": {"status": JournalEntryStatus.POSTED.value, "posted_at": datetime.utcnow()}}
-        )
-        
-        # 3. Create ledger records
+        # 2. Create ledger records
+        now = datetime.utcnow()
         ledger_records = []
         for entry in journal_entry["entries"]:
             ledger_record = {
@@ -608,11 +787,28 @@ async def post_journal_entry(
                 "amount": entry["amount"],
                 "description": entry["description"],
                 "voucher_id": journal_entry.get("voucher_id"),
-                "created_at": datetime.utcnow()
+                "created_at": now
             }
             ledger_records.append(ledger_record)
         
-        ledger_collection.insert_many(ledger_records)
+        def _post(session):
+            # 3. Flip the entry to posted; only one concurrent caller wins the draft
+            result = journal_entries_collection.update_one(
+                {"_id": ObjectId(journal_entry_id), "status": JournalEntryStatus.DRAFT.value},
+                {"$set": {"status": JournalEntryStatus.POSTED.value, "posted_at": now}},
+                session=session
+            )
+            if result.modified_count == 0:
+                raise HTTPException(status_code=400, detail="Only draft entries can be posted")
+            
+            # 4. Queue the ledger rows in the same transaction
+            ledger_collection.bulk_write(
+                [InsertOne(record) for record in ledger_records], ordered=False, session=session
+            )
+        
+        with client.start_session() as session:
+            session.with_transaction(_post)
+        invalidate_dashboard_cache(user_id)
         
         return {
             "message": "Journal entry posted successfully",
@@ -628,7 +824,7 @@ async def post_journal_entry(
 
 
 @router.get("/trial-balance")
-async def get_trial_balance(
+def get_trial_balance(
     as_of_date: date = Query(..., description="Trial balance as of date"),
     account_type: Optional[AccountType] = Query(None, description="Filter by account type")
 ):
@@ -636,86 +832,78 @@ async def get_trial_balance(
     Generate trial balance report.
     """
     try:
-        # Build query for ledger entries up to the specified date
-        query = {"transaction_date": {"$lte": as_of_date}}
-        
-        # Get all ledger entries up to the date
-        ledger_entries = list(ledger_collection.find(query))
-        
-        # Calculate balances by account
-        account_balances = {}
-        for entry in ledger_entries:
-            account_code = entry["account_code"]
-            amount = entry["amount"]
-            entry_type = entry["entry_type"]
-            
-            if account_code not in account_balances:
-                account_balances[account_code] = {
-                    "account_code": account_code,
-                    "account_name": entry["account_name"],
-                    "debit_total": 0,
-                    "credit_total": 0,
-                    "balance": 0
-                }
-            
-            if entry_type == EntryType.DEBIT.value:
-                account_balances[account_code]["debit_total"] += amount
-            else:
-                account_balances[account_code]["credit_total"] += amount
-        
-        # Calculate net balances and get account types
-        trial_balance = []
-        total_debits = 0
-        total_credits = 0
-        
-        for account_code, balance_data in account_balances.items():
-            # Get account type from chart of accounts
-            account_info = chart_of_accounts_collection.find_one({"account_code": account_code})
-            if not account_info:
-                continue
-            
-            account_type_value = account_info.get("account_type")
-            
-            # Filter by account type if specified
-            if account_type and account_type_value != account_type.value:
-                continue
-            
-            debit_total = balance_data["debit_total"]
-            credit_total = balance_data["credit_total"]
-            
-            # Calculate balance based on account type
-            if account_type_value in [AccountType.ASSET.value, AccountType.EXPENSE.value]:
-                # Normal debit balance accounts
-                balance = debit_total - credit_total
-            else:
-                # Normal credit balance accounts
-                balance = credit_total - debit_total
-            
-            balance_data["account_type"] = account_type_value
-            balance_data["balance"] = balance
-            
-            if balance > 0:
-                if account_type_value in [AccountType.ASSET.value, AccountType.EXPENSE.value]:
-                    total_debits += balance
-                else:
-                    total_credits += balance
-            elif balance < 0:
-                if account_type_value in [AccountType.ASSET.value, AccountType.EXPENSE.value]:
-                    total_credits += abs(balance)
-                else:
-                    total_debits += abs(balance)
-            
-            trial_balance.append(balance_data)
+        # Per-account debit/credit totals up to the date, with the account type
+        # from the chart of accounts; accounts missing from it are left out
+        pipeline = [
+            {"$match": {"transaction_date": {"$lte": as_of_date}}},
+            {"$group": {
+                "_id": "$account_code",
+                "account_name": {"$first": "$account_name"},
+                "debit_total": {"$sum": {"$cond": [{"$eq": ["$entry_type", EntryType.DEBIT.value]}, "$amount", 0]}},
+                "credit_total": {"$sum": {"$cond": [{"$eq": ["$entry_type", EntryType.DEBIT.value]}, 0, "$amount"]}}
+            }},
+            {"$lookup": {
+                "from": chart_of_accounts_collection.name,
+                "localField": "_id",
+                "foreignField": "account_code",
+                "as": "account"
+            }},
+            {"$addFields": {"account_type": {"$arrayElemAt": ["$account.account_type", 0]}}},
+            {"$match": {"account_type": account_type.value if account_type else {"$ne": None}}},
+            {"$project": {
+                "_id": 0,
+                "account_code": "$_id",
+                "account_name": 1,
+                "debit_total": 1,
+                "credit_total": 1,
+                # Normal debit balance for assets and expenses, credit balance otherwise
+                "balance": {"$cond": [
+                    {"$in": ["$account_type", DEBIT_NORMAL_ACCOUNT_TYPES]},
+                    {"$subtract": ["$debit_total", "$credit_total"]},
+                    {"$subtract": ["$credit_total", "$debit_total"]}
+                ]},
+                "account_type": 1
+            }},
+            {"$facet": {
+                "accounts": [{"$sort": {"account_code": 1}}],
+                # A balance lands in the debit column when debits exceed credits,
+                # whatever the account's normal side
+                "totals": [
+                    {"$addFields": {"net_debit": {"$subtract": ["$debit_total", "$credit_total"]}}},
+                    {"$group": {
+                        "_id": None,
+                        "total_debits": {"$sum": {"$max": ["$net_debit", 0]}},
+                        "total_credits": {"$sum": {"$max": [{"$multiply": ["$net_debit", -1]}, 0]}}
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "total_debits": 1,
+                        "total_credits": 1,
+                        # Tolerance only matters for entries stored as floats before Decimal128
+                        "is_balanced": {"$lt": [{"$abs": {"$subtract": ["$total_debits", "$total_credits"]}}, 0.01]}
+                    }}
+                ]
+            }}
+        ]
         
-        # Sort by account code
-        trial_balance.sort(key=lambda x: x["account_code"])
+        result = next(ledger_collection.aggregate(pipeline))
+        totals = result["totals"][0] if result["totals"] else {
+            "total_debits": 0, "total_credits": 0, "is_balanced": True
+        }
+        
+        trial_balance = [
+            {**balance_data, **{
+                field: to_decimal(balance_data[field]) for field in ("debit_total", "credit_total", "balance")
+            }}
+            for balance_data in result["accounts"]
+        ]
         
         return {
             "as_of_date": as_of_date,
             "trial_balance": trial_balance,
-            "total_debits": round(total_debits, 2),
-            "total_credits": round(total_credits, 2),
-            "is_balanced": abs(total_debits - total_credits) < 0.01,
+            "total_debits": round(to_decimal(totals["total_debits"]), 2),
+            "total_credits": round(to_decimal(totals["total_credits"]), 2),
+            "is_balanced": totals["is_balanced"],
             "account_count": len(trial_balance)
         }
         
@@ -726,7 +914,7 @@ async def get_trial_balance(
 # ==================== CHART OF ACCOUNTS MANAGEMENT ====================
 
 @router.post("/accounts")
-async def create_account(
+def create_account(
     account: Account,
     user_id: str = Query(..., description="User ID creating the account")
 ):
@@ -751,6 +939,8 @@ async def create_account(
         })
         
         result = chart_of_accounts_collection.insert_one(account_data)
+        with _account_cache_lock:
+            _account_cache.pop(account.account_code, None)
         
         return {
             "message": "Account created successfully",
@@ -766,10 +956,12 @@ async def create_account(
 
 
 @router.get("/accounts")
-async def get_chart_of_accounts(
+def get_chart_of_accounts(
     account_type: Optional[AccountType] = Query(None, description="Filter by account type"),
     is_active: bool = Query(True, description="Filter by active status"),
-    parent_account: Optional[str] = Query(None, description="Filter by parent account")
+    parent_account: Optional[str] = Query(None, description="Filter by parent account"),
+    skip: int = Query(0, ge=0, description="Number of accounts to skip"),
+    limit: int = Query(1000, ge=1, le=5000, description="Maximum number of accounts to return")
 ):
     """Get chart of accounts with filtering."""
     try:
@@ -781,7 +973,10 @@ async def get_chart_of_accounts(
         if parent_account:
             query["parent_account"] = parent_account
         
-        accounts = list(chart_of_accounts_collection.find(query).sort("account_code", 1))
+        accounts = list(chart_of_accounts_collection.find(query, ACCOUNT_LIST_PROJECTION)
+                        .sort("account_code", 1)
+                        .skip(skip)
+                        .limit(limit))
         
         for account in accounts:
             account["_id"] = str(account["_id"])
@@ -1,79 +1,73 @@
-
-from fastapi import APIRouter, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import StreamingResponse
-from PIL import Image
-import pytesseract
-import io
-import re
-import tempfile
-from google import genai
-from google.genai import types
-import os
-import re
-import xml.etree.ElementTree as ET
-from openai import OpenAI
-import bcrypt
-from datetime import datetime, timedelta
-import certifi
-from app.routes.auth import get_current_user
-from fastapi import FastAPI, HTTPException
-from pymongo import MongoClient
-from fastapi.security import OAuth2PasswordBearer
-import certifi
-from dotenv import load_dotenv
-from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, Dict, Any, List
-from fastapi import APIRouter, File, UploadFile, Depends, Form, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from bson import ObjectId
-from fastapi import APIRouter, File, Form, Depends, HTTPException, UploadFile
-import boto3
-import json
-from PIL import Image
-import io
-import os
-from openai import OpenAI
-from fastapi import Form
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_LEFT, TA_RIGHT
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, 
-    PageBreak
-)
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-from email.mime.text import MIMEText
-from urllib.parse import unquote
-
-load_dotenv()
-# Set Tesseract path (Windows)
-AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-OPENAI_KEY = os.getenv("OPENAI_API_KEY")
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-    region_name="eu-north-1"
-)
-
-bucket_name = "ai-auto-invoice"
-
-
-
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-db = client[DB_NAME]
-# Replace 'db' with your actual DB object
-voucher_collection = db["voucher"]
-ocr_collection = db["ocr"] 
+from cachetools import TTLCache
+from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import threading
+
+from app.db import db
+from app.routes.dashboard import invalidate_dashboard_cache
+
+logger = logging.getLogger(__name__)
+
 users_collection = db["users"]
 ledger_collection = db["ledger"]
-ocr_jobs_collection = db["ocr_jobs"]
+ledger_entries_collection = db["ledger_entries"]
+
+
+def _create_indexes():
+    """Create indexes backing the per-user ledger listing (newest first)"""
+    try:
+        ledger_collection.create_index([("user_id", ASCENDING), ("created_at", DESCENDING)])
+        ledger_entries_collection.create_index([("organization_id", ASCENDING), ("created_at", DESCENDING)])
+    except Exception as e:
+        logger.error(f"Error creating ledgers indexes: {e}")
+
 
+_create_indexes()
+
+# user_id -> organization_id; assignments change rarely, so a lookup is reused
+# for five minutes
+ORGANIZATION_CACHE_TTL_SECONDS = 300
+_organization_cache = TTLCache(maxsize=10000, ttl=ORGANIZATION_CACHE_TTL_SECONDS)
+_organization_cache_lock = threading.Lock()
+
+
+def get_user_organization_id(user_id: str) -> Optional[str]:
+    """
+    Organization the user's accounting entries belong to; the user's own id when
+    there is none (bank posting files them under it), None for an unknown user.
+    """
+    with _organization_cache_lock:
+        if user_id in _organization_cache:
+            return _organization_cache[user_id]
+    
+    user = None
+    if ObjectId.is_valid(user_id):
+        user = users_collection.find_one({"_id": ObjectId(user_id)}, {"organization_id": 1})
+    organization_id = str(user.get("organization_id", user_id)) if user else None
+    with _organization_cache_lock:
+        _organization_cache[user_id] = organization_id
+    return organization_id
+
+
+# user_id -> total ledger rows shown for the user; counts are only recomputed
+# every 30 seconds (deletes here drop the entry right away)
+LEDGER_COUNT_CACHE_TTL_SECONDS = 30
+_ledger_count_cache = TTLCache(maxsize=10000, ttl=LEDGER_COUNT_CACHE_TTL_SECONDS)
+_ledger_count_cache_lock = threading.Lock()
+
+
+def invalidate_ledger_count(user_id: Optional[str]) -> None:
+    """Drop the cached ledger total for a user"""
+    with _ledger_count_cache_lock:
+        _ledger_count_cache.pop(user_id, None)
 
 
 router = APIRouter(prefix="/accounting/ledgers", tags=["Ledgers"])
@@ -84,122 +78,185 @@ class LedgerUpdateRequest(BaseModel):
     invoice_data: Dict[str, Any] = Field(..., description="Complete invoice data to update")
 
 
+def _display_datetime(field: str, fmt: str, default: Any = "") -> Dict[str, Any]:
+    """Aggregation expression formatting a date field as text, passing other values through"""
+    return {"$cond": [
+        {"$eq": [{"$type": f"${field}"}, "date"]},
+        {"$dateToString": {"format": fmt, "date": f"${field}"}},
+        {"$ifNull": [f"${field}", default]}
+    ]}
+
+
+def accounting_display_stage(user_id: str) -> Dict[str, Any]:
+    """$project stage reshaping 'ledger_entries' rows to the OCR ledger display format"""
+    amount = {"$ifNull": ["$amount", 0]}
+    description = {"$ifNull": ["$description", ""]}
+    return {"$project": {
+        "_id": 1,
+        "user_id": {"$literal": user_id},
+        "voucher_id": {"$ifNull": ["$journal_entry_id", ""]},
+        "file_name": {"$concat": ["Bank Transaction - ", {"$toString": {"$ifNull": ["$reference", "N/A"]}}]},
+        "data_type": {"$literal": "bank_transaction"},
+        "ocr_text": description,
+        "invoice_data": {
+            "transaction_type": {"$cond": [{"$eq": ["$entry_type", "DEBIT"]}, "debit", "credit"]},
+            "account": {
+                "account_code": {"$ifNull": ["$account_code", ""]},
+                "account_name": {"$ifNull": ["$account_name", ""]}
+            },
+            "invoice": {
+                "invoice_number": {"$ifNull": ["$reference", ""]},
+                "invoice_date": {"$toString": _display_datetime("transaction_date", "%Y-%m-%d")},
+                "due_date": {"$literal": ""},
+                "amount_in_words": {"$literal": ""}
+            },
+            "items": [{
+                "description": description,
+                "qty": {"$literal": 1},
+                "unit_price": amount,
+                "subtotal": amount
+            }],
+            "totals": {
+                "total": amount,
+                "running_balance": {"$ifNull": ["$running_balance", 0]}
+            }
+        },
+        "llm_error": {"$literal": None},
+        "processing_status": {"$literal": "success"},
+        "created_at": {"$ifNull": ["$created_at", ""]}
+    }}
+
+
+# OCR ledger fields returned by the listing; ocr_text and toon_data are large
+# and only sent on request
+OCR_LEDGER_LIST_FIELDS = [
+    "user_id", "voucher_id", "file_name", "data_type", "invoice_data", "llm_error",
+    "processing_status", "modelo_id", "created_at", "updated_at"
+]
+
+
+def combined_ledger_pipeline(
+    user_id: str, organization_id: Optional[str], skip: int, limit: int, include_ocr_text: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Pipeline over 'ledger' that unions the organization's 'ledger_entries' rows,
+    newest first, with ids and dates rendered for display and modelo details attached.
+    Each side is cut to its newest skip + limit rows before the merge; without an
+    organization only the OCR rows are read.
+    """
+    newest = [{"$sort": {"created_at": -1}}, {"$limit": skip + limit}]
+    ocr_fields = OCR_LEDGER_LIST_FIELDS + ["ocr_text"] if include_ocr_text else OCR_LEDGER_LIST_FIELDS
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        *newest,
+        {"$project": {field: 1 for field in ocr_fields}}
+    ]
+    if organization_id:
+        pipeline.append({"$unionWith": {
+            "coll": ledger_entries_collection.name,
+            "pipeline": [
+                {"$match": {"organization_id": organization_id}},
+                *newest,
+                accounting_display_stage(user_id)
+            ]
+        }})
+    return pipeline + [
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$lookup": {
+            "from": "modelos",
+            "let": {"modelo_oid": {"$convert": {
+                "input": "$modelo_id", "to": "objectId", "onError": None, "onNull": None
+            }}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$modelo_oid"]}}},
+                {"$project": {
+                    "_id": {"$toString": "$_id"},
+                    "modelo_no": {"$ifNull": ["$modelo_no", None]},
+                    "name": {"$ifNull": ["$name", None]},
+                    "periodicity": {"$ifNull": ["$periodicity", None]},
+                    "deadline": {"$ifNull": ["$deadline", None]}
+                }}
+            ],
+            "as": "modelo"
+        }},
+        {"$set": {
+            "_id": {"$toString": "$_id"},
+            "created_at": _display_datetime("created_at", "%Y-%m-%d %H:%M:%S", "$$REMOVE"),
+            "modelo": {"$ifNull": [{"$first": "$modelo"}, "$$REMOVE"]}
+        }}
+    ]
+
+
 @router.get("/user/{user_id}")
 async def get_ledger_by_user(
-    user_id: str
+    user_id: str,
+    skip: int = Query(0, ge=0, description="Number of entries to skip"),
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of entries to return"),
+    include_ocr_text: bool = Query(False, description="Include the raw OCR text of OCR-based entries")
 ):
     """
-    Get all ledger entries for a specific user.
+    Get a page of ledger entries for a specific user, newest first.
     Fetches from both 'ledger' (OCR-based) and 'ledger_entries' (accounting-based) collections.
     Example: GET /accounting/ledgers/user/123
     """
-    try:
-        # Get user's organization_id
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        organization_id = str(user.get("organization_id", user_id)) if user else user_id
-        # Query 1: Fetch from old 'ledger' collection (OCR-based ledger)
-        query_ocr = {"user_id": user_id}
-        ocr_ledger_entries = list(ledger_collection.find(query_ocr).sort("created_at", -1))
-
-        # Format OCR entries - keep original format
-        for entry in ocr_ledger_entries:
-            entry["_id"] = str(entry["_id"])
-            if isinstance(entry.get("created_at"), datetime):
-                entry["created_at"] = entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # Query 2: Fetch from new 'ledger_entries' collection (accounting ledger)
-        ledger_entries_collection = db["ledger_entries"]
-        query_accounting = {"organization_id": organization_id}
-        accounting_ledger_entries = list(ledger_entries_collection.find(query_accounting).sort("created_at", -1))
-
-        # Format accounting entries to match OCR ledger structure
-        formatted_accounting_entries = []
-        for entry in accounting_ledger_entries:
-            # Convert accounting ledger to display format that matches OCR structure
-            formatted_entry = {
-                "_id": str(entry["_id"]),
-                "user_id": user_id,
-                "voucher_id": entry.get("journal_entry_id", ""),
-                "file_name": f"Bank Transaction - {entry.get('reference', 'N/A')}",
-                "data_type": "bank_transaction",
-                "ocr_text": entry.get("description", ""),
-                "invoice_data": {
-                    "transaction_type": "debit" if entry.get("entry_type") == "DEBIT" else "credit",
-                    "account": {
-                        "account_code": entry.get("account_code", ""),
-                        "account_name": entry.get("account_name", "")
-                    },
-                    "invoice": {
-                        "invoice_number": entry.get("reference", ""),
-                        "invoice_date": entry.get("transaction_date").strftime("%Y-%m-%d") if isinstance(entry.get("transaction_date"), datetime) else str(entry.get("transaction_date", "")),
-                        "due_date": "",
-                        "amount_in_words": ""
-                    },
-                    "items": [
-                        {
-                            "description": entry.get("description", ""),
-                            "qty": 1,
-                            "unit_price": entry.get("amount", 0),
-                            "subtotal": entry.get("amount", 0)
-                        }
-                    ],
-                    "totals": {
-                        "total": entry.get("amount", 0),
-                        "running_balance": entry.get("running_balance", 0)
-                    }
-                },
-                "llm_error": None,
-                "processing_status": "success",
-                "created_at": entry.get("created_at").strftime("%Y-%m-%d %H:%M:%S") if isinstance(entry.get("created_at"), datetime) else str(entry.get("created_at", ""))
-            }
-            formatted_accounting_entries.append(formatted_entry)
-
-        # Combine both lists
-        all_entries = ocr_ledger_entries + formatted_accounting_entries
-
-        # Enrich entries with modelo details if modelo_id exists
-        for entry in all_entries:
-            if entry.get("modelo_id"):
-                try:
-                    modelo = db["modelos"].find_one({"_id": ObjectId(entry["modelo_id"])})
-                    if modelo:
-                        entry["modelo"] = {
-                            "_id": str(modelo["_id"]),
-                            "modelo_no": modelo.get("modelo_no"),
-                            "name": modelo.get("name"),
-                            "periodicity": modelo.get("periodicity"),
-                            "deadline": modelo.get("deadline")
-                        }
-                except Exception as e:
-                    # If lookup fails, just continue without modelo details
-                    pass
-
-        # Sort combined list by created_at (newest first)
-        all_entries.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-        total_count = len(all_entries)
-
-        if total_count == 0:
-            return {
-                "user_id": user_id,
-                "entries": [],
-                "total_count": 0,
-                "message": "No ledger entries found for this user"
-            }
-
-        # Return in original format (backward compatible)
-        return {
+    # Get user's organization_id
+    organization_id = await run_in_threadpool(get_user_organization_id, user_id)
+    # One aggregation merges both collections, sorts them and attaches
+    # modelo details on the server; on a count cache miss the totals are
+    # counted alongside
+    pipeline = combined_ledger_pipeline(user_id, organization_id, skip, limit, include_ocr_text)
+    with _ledger_count_cache_lock:
+        total_count = _ledger_count_cache.get(user_id)
+
+    def ledger_counts():
+        counts = [run_in_threadpool(ledger_collection.count_documents, {"user_id": user_id})]
+        if organization_id:
+            counts.append(
+                run_in_threadpool(ledger_entries_collection.count_documents, {"organization_id": organization_id})
+            )
+        return counts
+
+    if total_count is None:
+        all_entries, *totals = await asyncio.gather(
+            run_in_threadpool(lambda: list(ledger_collection.aggregate(pipeline))),
+            *ledger_counts()
+        )
+        total_count = sum(totals)
+        with _ledger_count_cache_lock:
+            _ledger_count_cache[user_id] = total_count
+    else:
+        all_entries = await run_in_threadpool(lambda: list(ledger_collection.aggregate(pipeline)))
+        # The cached total lags behind new entries; a page reaching past it
+        # means it is stale, so count again
+        if skip + len(all_entries) > total_count:
+            total_count = sum(await asyncio.gather(*ledger_counts()))
+            with _ledger_count_cache_lock:
+                _ledger_count_cache[user_id] = total_count
+
+    if not all_entries and skip == 0:
+        with _ledger_count_cache_lock:
+            _ledger_count_cache.pop(user_id, None)
+        return ORJSONResponse({
             "user_id": user_id,
-            "entries": all_entries,
-            "total_count": total_count
-        }
+            "entries": [],
+            "total_count": 0,
+            "message": "No ledger entries found for this user"
+        })
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error retrieving ledger entries: {str(e)}")
+    # Return in original format (backward compatible); the rows are already
+    # JSON-ready, so they go straight to orjson
+    return ORJSONResponse({
+        "user_id": user_id,
+        "entries": all_entries,
+        "total_count": total_count,
+        "returned_count": len(all_entries)
+    })
 
 
 @router.get("/user/{user_id}/export-pdf")
-async def export_ledger_pdf(
+def export_ledger_pdf(
     user_id: str,
     from_date: Optional[str] = None,
     to_date: Optional[str] = None,
@@ -218,164 +275,101 @@ async def export_ledger_pdf(
 
     Returns: PDF file as direct download
     """
-    try:
-        from app.utils.pdf_generator import generate_ledger_pdf
-
-        # Get user's organization_id
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
-        organization_id = str(user.get("organization_id", user_id)) if user else user_id
-
-        # Parse specific IDs if provided
-        specific_ids = []
-        if ids:
-            specific_ids = [id.strip() for id in ids.split(",") if id.strip()]
-
-        # Query 1: Fetch from old 'ledger' collection (OCR-based ledger)
-        if specific_ids:
-            # Fetch specific entries by IDs
-            ocr_ids = [ObjectId(id) for id in specific_ids if ObjectId.is_valid(id)]
-            query_ocr = {"_id": {"$in": ocr_ids}, "user_id": user_id}
-        else:
-            # Fetch all entries for user
-            query_ocr = {"user_id": user_id}
-
-        ocr_ledger_entries = list(ledger_collection.find(query_ocr).sort("created_at", -1))
-
-        # Format OCR entries - keep original format
-        for entry in ocr_ledger_entries:
-            entry["_id"] = str(entry["_id"])
-            if isinstance(entry.get("created_at"), datetime):
-                entry["created_at"] = entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-
-        # Query 2: Fetch from new 'ledger_entries' collection (accounting ledger)
-        ledger_entries_collection = db["ledger_entries"]
-        if specific_ids:
-            # Fetch specific entries by IDs
-            accounting_ids = [ObjectId(id) for id in specific_ids if ObjectId.is_valid(id)]
-            query_accounting = {"_id": {"$in": accounting_ids}, "organization_id": organization_id}
-        else:
-            # Fetch all entries for organization
-            query_accounting = {"organization_id": organization_id}
-
-        accounting_ledger_entries = list(ledger_entries_collection.find(query_accounting).sort("created_at", -1))
-
-        # Format accounting entries to match OCR ledger structure
-        formatted_accounting_entries = []
-        for entry in accounting_ledger_entries:
-            # Convert accounting ledger to display format that matches OCR structure
-            formatted_entry = {
-                "_id": str(entry["_id"]),
-                "user_id": user_id,
-                "voucher_id": entry.get("journal_entry_id", ""),
-                "file_name": f"Bank Transaction - {entry.get('reference', 'N/A')}",
-                "data_type": "bank_transaction",
-                "ocr_text": entry.get("description", ""),
-                "invoice_data": {
-                    "transaction_type": "debit" if entry.get("entry_type") == "DEBIT" else "credit",
-                    "account": {
-                        "account_code": entry.get("account_code", ""),
-                        "account_name": entry.get("account_name", "")
-                    },
-                    "invoice": {
-                        "invoice_number": entry.get("reference", ""),
-                        "invoice_date": entry.get("transaction_date").strftime("%Y-%m-%d") if isinstance(entry.get("transaction_date"), datetime) else str(entry.get("transaction_date", "")),
-                        "due_date": "",
-                        "amount_in_words": ""
-                    },
-                    "items": [
-                        {
-                            "description": entry.get("description", ""),
-                            "qty": 1,
-                            "unit_price": entry.get("amount", 0),
-                            "subtotal": entry.get("amount", 0)
-                        }
-                    ],
-                    "totals": {
-                        "total": entry.get("amount", 0),
-                        "running_balance": entry.get("running_balance", 0)
-                    }
-                },
-                "llm_error": None,
-                "processing_status": "success",
-                "created_at": entry.get("created_at").strftime("%Y-%m-%d %H:%M:%S") if isinstance(entry.get("created_at"), datetime) else str(entry.get("created_at", ""))
-            }
-            formatted_accounting_entries.append(formatted_entry)
-
-        # Combine both lists
-        all_entries = ocr_ledger_entries + formatted_accounting_entries
-
-        # Apply filters
-        filtered_entries = []
-        for entry in all_entries:
-            # Filter by entry type
-            if entry_type != "all":
-                if entry.get("data_type") != entry_type:
-                    continue
-
-            # Filter by date range
-            entry_date_str = entry.get("created_at", "")
-            if from_date or to_date:
-                try:
-                    # Parse entry date
-                    entry_date = datetime.strptime(entry_date_str[:10], "%Y-%m-%d")
-
-                    if from_date:
-                        from_dt = datetime.strptime(from_date, "%Y-%m-%d")
-                        if entry_date < from_dt:
-                            continue
-
-                    if to_date:
-                        to_dt = datetime.strptime(to_date, "%Y-%m-%d")
-                        if entry_date > to_dt:
-                            continue
-                except:
-                    # If date parsing fails, include the entry
-                    pass
-
-            filtered_entries.append(entry)
-
-        # Sort by created_at (newest first)
-        filtered_entries.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-        if not filtered_entries:
-            raise HTTPException(status_code=404, detail="No ledger entries found matching the criteria")
-
-        # Prepare user info and filters for PDF
-        user_info = {
-            "user_id": user_id,
-            "organization_id": organization_id
-        }
+    from app.utils.pdf_generator import generate_ledger_pdf
+
+    # Get user's organization_id
+    organization_id = get_user_organization_id(user_id)
+
+    # Parse specific IDs if provided; malformed ones can't match anything
+    specific_ids = []
+    if ids:
+        specific_ids = [id.strip() for id in ids.split(",") if id.strip()]
+    specific_oids = [ObjectId(id) for id in specific_ids if ObjectId.is_valid(id)]
+
+    # Query 1: old 'ledger' collection (OCR-based ledger)
+    # Query 2: new 'ledger_entries' collection (accounting ledger)
+    if specific_ids:
+        # Fetch specific entries by IDs
+        query_ocr = {"_id": {"$in": specific_oids}, "user_id": user_id}
+        query_accounting = {"_id": {"$in": specific_oids}, "organization_id": organization_id}
+    else:
+        # Fetch all entries for user / organization
+        query_ocr = {"user_id": user_id}
+        query_accounting = {"organization_id": organization_id}
 
-        filters = {
-            "from_date": from_date,
-            "to_date": to_date,
-            "entry_type": entry_type
-        }
+    # Both are merged, reshaped, filtered and sorted in one aggregation; the
+    # accounting side is skipped for an unknown user or an OCR-only export
+    pipeline = [{"$match": query_ocr}]
+    if organization_id and entry_type in ("all", "bank_transaction"):
+        pipeline.append({"$unionWith": {
+            "coll": ledger_entries_collection.name,
+            "pipeline": [{"$match": query_accounting}, accounting_display_stage(user_id)]
+        }})
+
+    # Filter by entry type
+    if entry_type != "all":
+        pipeline.append({"$match": {"data_type": entry_type}})
+
+    # Filter by date range (whole days); entries without a created_at date are kept
+    if from_date or to_date:
+        try:
+            created_range = {}
+            if from_date:
+                created_range["$gte"] = datetime.strptime(from_date, "%Y-%m-%d")
+            if to_date:
+                created_range["$lt"] = datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+        pipeline.append({"$match": {"$or": [
+            {"created_at": {"$not": {"$type": "date"}}},
+            {"created_at": created_range}
+        ]}})
+
+    # Sort by created_at (newest first), then render ids and dates
+    pipeline += [
+        {"$sort": {"created_at": -1}},
+        {"$set": {
+            "_id": {"$toString": "$_id"},
+            "created_at": _display_datetime("created_at", "%Y-%m-%d %H:%M:%S", "$$REMOVE")
+        }}
+    ]
+
+    filtered_entries = list(ledger_collection.aggregate(pipeline))
+
+    if not filtered_entries:
+        raise HTTPException(status_code=404, detail="No ledger entries found matching the criteria")
+
+    # Prepare user info and filters for PDF
+    user_info = {
+        "user_id": user_id,
+        "organization_id": organization_id or user_id
+    }
 
-        # Generate PDF
-        pdf_buffer = generate_ledger_pdf(filtered_entries, user_info, filters)
+    filters = {
+        "from_date": from_date,
+        "to_date": to_date,
+        "entry_type": entry_type
+    }
 
-        # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"ledger_export_{user_id}_{timestamp}.pdf"
+    # Generate PDF
+    pdf_buffer = generate_ledger_pdf(filtered_entries, user_info, filters)
 
-        # Return PDF as streaming response with download headers
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
+    # Create filename with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"ledger_export_{user_id}_{timestamp}.pdf"
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
+    # Return PDF as streaming response with download headers
+    return StreamingResponse(
+        pdf_buffer,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
 
 
 @router.put("/{ledger_id}")
-async def update_ledger_entry(
+def update_ledger_entry(
     ledger_id: str,
     update_data: LedgerUpdateRequest
 ):
@@ -419,49 +413,41 @@ async def update_ledger_entry(
         }
     }
     """
-    try:
-        # Check if ledger entry exists
-        ledger_entry = ledger_collection.find_one({"_id": ObjectId(ledger_id)})
-        if not ledger_entry:
-            raise HTTPException(status_code=404, detail="Ledger entry not found")
-        
-        # Update only invoice_data field
-        update_doc = {
-            "invoice_data": update_data.invoice_data,
-            "updated_at": datetime.utcnow()
-        }
-        
-        # Update the ledger entry
-        result = ledger_collection.update_one(
-            {"_id": ObjectId(ledger_id)},
-            {"$set": update_doc}
-        )
-        
-        if result.modified_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to update ledger entry")
-        
-        # Get updated entry
-        updated_entry = ledger_collection.find_one({"_id": ObjectId(ledger_id)})
-        updated_entry["_id"] = str(updated_entry["_id"])
-        if isinstance(updated_entry.get("created_at"), datetime):
-            updated_entry["created_at"] = updated_entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
-        if isinstance(updated_entry.get("updated_at"), datetime):
-            updated_entry["updated_at"] = updated_entry["updated_at"].strftime("%Y-%m-%d %H:%M:%S")
-        
-        return {
-            "message": "Invoice data updated successfully",
-            "ledger_id": ledger_id,
-            "updated_entry": updated_entry
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error updating ledger entry: {str(e)}")
+    if not ObjectId.is_valid(ledger_id):
+        raise HTTPException(status_code=400, detail="Invalid ledger_id")
+    ledger_oid = ObjectId(ledger_id)
+    
+    # Update only invoice_data field
+    update_doc = {
+        "invoice_data": update_data.invoice_data,
+        "updated_at": datetime.utcnow()
+    }
+    
+    # Update the ledger entry and get it back in one round trip
+    updated_entry = ledger_collection.find_one_and_update(
+        {"_id": ledger_oid},
+        {"$set": update_doc},
+        return_document=ReturnDocument.AFTER
+    )
+    if not updated_entry:
+        raise HTTPException(status_code=404, detail="Ledger entry not found")
+    invalidate_dashboard_cache(updated_entry.get("user_id"))
+    
+    updated_entry["_id"] = str(updated_entry["_id"])
+    if isinstance(updated_entry.get("created_at"), datetime):
+        updated_entry["created_at"] = updated_entry["created_at"].strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(updated_entry.get("updated_at"), datetime):
+        updated_entry["updated_at"] = updated_entry["updated_at"].strftime("%Y-%m-%d %H:%M:%S")
+    
+    return ORJSONResponse({
+        "message": "Invoice data updated successfully",
+        "ledger_id": ledger_id,
+        "updated_entry": updated_entry
+    })
 
 
 @router.put("/{entry_id}/modelo")
-async def update_ledger_modelo(
+def update_ledger_modelo(
     entry_id: str,
     modelo_id: str = None,
     user_id: str = None
@@ -471,102 +457,93 @@ async def update_ledger_modelo(
     Assigns the modelo_id to the ledger entry.
     Checks both 'ledger' and 'ledger_entries' collections.
     """
-    try:
-        # Validate entry exists
-        if not ObjectId.is_valid(entry_id):
-            raise HTTPException(status_code=400, detail="Invalid entry ID format")
-        
-        # Check both collections
-        ledger_entries_collection = db["ledger_entries"]
-        entry = ledger_entries_collection.find_one({"_id": ObjectId(entry_id)})
-        collection_used = "ledger_entries"
-        
-        # If not in ledger_entries, check ledger
-        if not entry:
-            entry = ledger_collection.find_one({"_id": ObjectId(entry_id)})
-            collection_used = "ledger"
+    # Validate entry exists
+    if not ObjectId.is_valid(entry_id):
+        raise HTTPException(status_code=400, detail="Invalid entry ID format")
+    entry_oid = ObjectId(entry_id)
+    
+    # Check both collections
+    entry = ledger_entries_collection.find_one({"_id": entry_oid})
+    collection_used = "ledger_entries"
+    
+    # If not in ledger_entries, check ledger
+    if not entry:
+        entry = ledger_collection.find_one({"_id": entry_oid})
+        collection_used = "ledger"
+    
+    if not entry:
+        raise HTTPException(status_code=404, detail="Ledger entry not found in either collection")
+    
+    # Validate modelo exists if provided
+    if modelo_id:
+        if not ObjectId.is_valid(modelo_id):
+            raise HTTPException(status_code=400, detail="Invalid modelo ID format")
         
-        if not entry:
-            raise HTTPException(status_code=404, detail="Ledger entry not found in either collection")
-        
-        # Validate modelo exists if provided
-        if modelo_id:
-            if not ObjectId.is_valid(modelo_id):
-                raise HTTPException(status_code=400, detail="Invalid modelo ID format")
-            
-            modelo = db["modelos"].find_one({"_id": ObjectId(modelo_id)})
-            if not modelo:
-                raise HTTPException(status_code=404, detail="Modelo not found")
-        
-            # Update in the collection where entry was found
-            if collection_used == "ledger_entries":
-                result = ledger_entries_collection.update_one(
-                    {"_id": ObjectId(entry_id)},
-                    {"$set": {
-                        "modelo_id": modelo_id,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-            else:
-                result = ledger_collection.update_one(
-                    {"_id": ObjectId(entry_id)},
-                    {"$set": {
-                        "modelo_id": modelo_id,
-                        "updated_at": datetime.utcnow()
-                    }}
-                )
-            
-            if result.modified_count == 0:
-                raise HTTPException(status_code=500, detail="Failed to update ledger entry")
-            
-            return {
-                "message": "Modelo assigned successfully",
-                "entry_id": entry_id,
-                "collection": collection_used,
-                "modelo_id": modelo_id,
-                "modelo_no": modelo.get("modelo_no"),
-                "modelo_name": modelo.get("name")
-            }
+        modelo = db["modelos"].find_one({"_id": ObjectId(modelo_id)})
+        if not modelo:
+            raise HTTPException(status_code=404, detail="Modelo not found")
+    
+        # Update in the collection where entry was found
+        if collection_used == "ledger_entries":
+            result = ledger_entries_collection.update_one(
+                {"_id": entry_oid},
+                {"$set": {
+                    "modelo_id": modelo_id,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+        else:
+            result = ledger_collection.update_one(
+                {"_id": entry_oid},
+                {"$set": {
+                    "modelo_id": modelo_id,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
         
-        raise HTTPException(status_code=400, detail="modelo_id is required")
+        if result.modified_count == 0:
+            raise HTTPException(status_code=500, detail="Failed to update ledger entry")
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        return {
+            "message": "Modelo assigned successfully",
+            "entry_id": entry_id,
+            "collection": collection_used,
+            "modelo_id": modelo_id,
+            "modelo_no": modelo.get("modelo_no"),
+            "modelo_name": modelo.get("name")
+        }
+    
+    raise HTTPException(status_code=400, detail="modelo_id is required")
 
 
 @router.delete("/{ledger_id}")
-async def delete_ledger_entry(
+def delete_ledger_entry(
     ledger_id: str
 ):
     """
     Delete a ledger entry by its ID.
     Example: DELETE /accounting/ledgers/69083ec9be8d0f81ff44275b
     """
-    try:
-        # Check if ledger entry exists
-        ledger_entry = ledger_collection.find_one({"_id": ObjectId(ledger_id)})
-        if not ledger_entry:
-            raise HTTPException(status_code=404, detail="Ledger entry not found")
-        
-        # Delete the ledger entry
-        result = ledger_collection.delete_one({"_id": ObjectId(ledger_id)})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=500, detail="Failed to delete ledger entry")
-        
-        return {
-            "message": "Ledger entry deleted successfully",
-            "ledger_id": ledger_id,
-            "deleted_entry": {
-                "user_id": ledger_entry.get("user_id"),
-                "voucher_id": ledger_entry.get("voucher_id"),
-                "processing_status": ledger_entry.get("processing_status")
-            }
+    if not ObjectId.is_valid(ledger_id):
+        raise HTTPException(status_code=400, detail="Invalid ledger_id")
+    ledger_oid = ObjectId(ledger_id)
+    
+    # Delete the ledger entry, keeping the fields echoed back
+    ledger_entry = ledger_collection.find_one_and_delete(
+        {"_id": ledger_oid},
+        projection={"user_id": 1, "voucher_id": 1, "processing_status": 1}
+    )
+    if not ledger_entry:
+        raise HTTPException(status_code=404, detail="Ledger entry not found")
+    invalidate_ledger_count(ledger_entry.get("user_id"))
+    invalidate_dashboard_cache(ledger_entry.get("user_id"))
+    
+    return {
+        "message": "Ledger entry deleted successfully",
+        "ledger_id": ledger_id,
+        "deleted_entry": {
+            "user_id": ledger_entry.get("user_id"),
+            "voucher_id": ledger_entry.get("voucher_id"),
+            "processing_status": ledger_entry.get("processing_status")
         }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error deleting ledger entry: {str(e)}")
+    }
@@ -20,14 +20,10 @@ from app.routes.auth import get_current_user
 # Database connection
 from pymongo import MongoClient
 import os
-import certifi
-from dotenv import load_dotenv
 
-load_dotenv()
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+from app.config import CA_FILE, DB_NAME, MONGO_URI
 
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 
 router = APIRouter(tags=["Modelos"])
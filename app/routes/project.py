@@ -3,14 +3,11 @@ from fastapi import APIRouter, File, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
 from pymongo import MongoClient
 from bson import ObjectId
-from dotenv import load_dotenv
 import os
-import certifi
 from fastapi import APIRouter, HTTPException
 from app.routes.auth import get_current_user
 from pymongo import MongoClient
 from datetime import datetime
-import certifi
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
@@ -23,7 +20,7 @@ import os
 from datetime import datetime
 
 # Load env variables
-load_dotenv()
+from app.config import CA_FILE, DB_NAME, MONGO_URI
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
@@ -33,10 +30,8 @@ os.environ["FONTCONFIG_FILE"] = r"C:\OCR Project\fonts\fonts.conf"
 
 router = APIRouter()
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
 
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 projects_collection = db["projects"]
 ocr_collection = db["ocr"]  # Replace 'db' with your actual DB object
@@ -180,7 +175,7 @@ async def create_project(
 
     # Step 2: Save project with status "pending"
     new_project = {
-        "user_id": str(current_user["_id"]),
+        "user_id": current_user["_id"],
         "title": title,
         "description": description,
         "color": color,
@@ -195,7 +190,7 @@ async def create_project(
     file_records = []
     for file in files:
         s3_key = upload_to_s3(
-            user_id=str(current_user["_id"]),
+            user_id=current_user["_id"],
             project_id=project_id,
             file=file,
             folder_type="Package"
@@ -225,7 +220,7 @@ async def create_project(
     return {
         "message": "Project created",
         "project_id": project_id,
-        "user_id": str(current_user["_id"]),
+        "user_id": current_user["_id"],
         "files": file_records,
         "status": "pending"
     }
@@ -297,7 +292,7 @@ def delete_project(
     # Check if project exists and belongs to user
     project = projects_collection.find_one({
         "_id": ObjectId(project_id),
-        "user_id": str(current_user["_id"])
+        "user_id": current_user["_id"]
     })
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
@@ -1,15 +1,13 @@
 from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime,timezone
 from bson import ObjectId
-import certifi
 import os
 from pymongo import MongoClient
 from typing import Optional
 # Set Tesseract path (Windows)
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
+from app.config import CA_FILE, DB_NAME, MONGO_URI
 
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 projects_collection = db["projects"]
 report_collection = db["report"]
@@ -3,14 +3,11 @@ from fastapi import APIRouter, File, Depends, HTTPException
 from pydantic import BaseModel, EmailStr
 from pymongo import MongoClient
 from bson import ObjectId
-from dotenv import load_dotenv
 import os
-import certifi
 from fastapi import APIRouter, HTTPException
 from app.routes.auth import get_current_user
 from pymongo import MongoClient
 from datetime import datetime
-import certifi
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from datetime import datetime
@@ -29,7 +26,8 @@ from datetime import datetime
 from fastapi import Query
 from fastapi.responses import FileResponse
 # Load env variables
-load_dotenv()
+from app.config import CA_FILE, DB_NAME, MONGO_URI
+from app.routes.dashboard import invalidate_dashboard_cache
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
@@ -39,9 +37,7 @@ os.environ["FONTCONFIG_FILE"] = r"C:\OCR Project\fonts\fonts.conf"
 
 router = APIRouter(prefix="/accounting/voucher", tags=["vouchers"])
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME")
-client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+client = MongoClient(MONGO_URI, tlsCAFile=CA_FILE)
 db = client[DB_NAME]
 voucher_collection = db["voucher"]
 ocr_collection = db["ocr"]  # Replace 'db' with your actual DB object
@@ -129,6 +125,7 @@ async def upload_voucher(
     
     result = voucher_collection.insert_one(new_voucher)
     voucher_id = str(result.inserted_id)
+    invalidate_dashboard_cache(user_id)
 
     # Step 3: Upload each file to S3
     file_records = []
@@ -451,6 +448,7 @@ async def send_multiple_for_approval(
                 )
                 
                 if result.modified_count > 0:
+                    invalidate_dashboard_cache(voucher.get("user_id"))
                     results["successful"].append({
                         "voucher_id": voucher_id,
                         "status": "awaiting_approval"
@@ -521,6 +519,8 @@ async def send_for_approval(
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to update voucher")
         
+        invalidate_dashboard_cache(voucher.get("user_id"))
+        
         # Get updated voucher
         updated_voucher = voucher_collection.find_one({"_id": obj_id})
         updated_voucher["_id"] = str(updated_voucher["_id"])
@@ -610,6 +610,7 @@ async def approve_vouchers(
                     {"$set": update_data}
                 )
                 if result.modified_count > 0:
+                    invalidate_dashboard_cache(voucher.get("user_id"))
                     results["successful"].append({
                         "voucher_id": voucher_id,
                         "status": "approved"
@@ -701,6 +702,7 @@ async def reject_vouchers(
                 )
                 
                 if result.modified_count > 0:
+                    invalidate_dashboard_cache(voucher.get("user_id"))
                     results["successful"].append({
                         "voucher_id": voucher_id,
                         "status": "rejected"
@@ -1218,6 +1220,8 @@ async def convert_emails_to_toon(emails_input: EmailsInput):
                 "toon_data": toon_string
             })
         
+        invalidate_dashboard_cache(emails_input.user_id)
+        
         return {
             "success": True,
             "count": len(stored_vouchers),
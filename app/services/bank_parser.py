@@ -20,7 +20,6 @@ except ImportError:  # pragma: no cover - optional dependency
 
 # Third-party parsers
 import mt940
-from pycamt.parser import Camt053Parser
 from defusedxml import ElementTree as ET
 
 try:
@@ -55,6 +54,7 @@ class BankStatementParser:
         file_name: str,
         format_type: Optional[BankStatementFormat],
         imported_by: Optional[str] = None,
+        file_hash: Optional[str] = None,
     ) -> Tuple[BankStatement, List[BankTransaction]]:
         """
         Parse bank statement file and return statement + transactions.
@@ -67,12 +67,14 @@ class BankStatementParser:
             file_name: Original filename
             format_type: Statement format (CSV, CAMT053, MT940)
             imported_by: User ID who imported
+            file_hash: SHA-256 hex digest of file_content, if already computed
 
         Returns:
             Tuple of (BankStatement, List[BankTransaction])
         """
         # Calculate file hash to prevent duplicates
-        file_hash = hashlib.sha256(file_content).hexdigest()
+        if file_hash is None:
+            file_hash = hashlib.sha256(file_content).hexdigest()
 
         # Build ordered list of formats to attempt (user-provided first, detected second)
         formats_to_try: List[BankStatementFormat] = []
@@ -264,13 +266,8 @@ class BankStatementParser:
         CAMT.053 is the modern XML-based standard for bank statements
         """
         try:
-            # Parse XML using pycamt library
-            xml_string = file_content.decode("utf-8")
-            parser = Camt053Parser(xml_string)
-
-            # Get statement info
-            stmt_info = parser.get_statement_info()
-            transactions_data = parser.get_transactions()
+            # Stream entries out of the XML instead of building a full tree
+            transactions_data, stmt_info = self._iter_camt053(file_content)
 
             transactions = []
             total_debits = 0.0
@@ -374,6 +371,106 @@ class BankStatementParser:
             logger.error(f"Error parsing CAMT.053 file: {e}")
             raise ValueError(f"Failed to parse CAMT.053 file: {str(e)}")
 
+    @classmethod
+    def _iter_camt053(cls, file_content: bytes) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Stream a CAMT.053 document with iterparse
+
+        Each <Ntry> (and <Bal>) is reduced to a flat dict and cleared as soon
+        as its end tag is seen, so memory stays proportional to the entries
+        kept rather than to the whole XML tree. Tags are matched regardless
+        of the camt.053 schema version namespace.
+
+        Returns:
+            Tuple of (entry dicts, statement info dict)
+        """
+        entries: List[Dict[str, Any]] = []
+        stmt_info: Dict[str, Any] = {}
+
+        for _, elem in ET.iterparse(BytesIO(file_content), events=("end",)):
+            tag = elem.tag.rsplit("}", 1)[-1]
+
+            if tag == "Ntry":
+                entries.append(cls._camt_entry_data(elem))
+                elem.clear()
+
+            elif tag == "Bal":
+                balance_type = elem.findtext("{*}Tp/{*}CdOrPrtry/{*}Cd")
+                amount = float(elem.findtext("{*}Amt") or 0)
+                if elem.findtext("{*}CdtDbtInd") == "DBIT":
+                    amount = -amount
+                # Opening from the first statement, closing from the last
+                if balance_type in ("OPBD", "PRCD") and "opening_balance" not in stmt_info:
+                    stmt_info["opening_balance"] = {"amount": amount}
+                elif balance_type in ("CLBD", "CLAV") and (
+                    balance_type == "CLBD" or "closing_balance" not in stmt_info
+                ):
+                    stmt_info["closing_balance"] = {"amount": amount}
+                elem.clear()
+
+            elif tag in ("Stmt", "Rpt"):
+                stmt_info.setdefault("statement_id", elem.findtext("{*}Id"))
+                from_date = elem.findtext("{*}FrToDt/{*}FrDtTm")
+                to_date = elem.findtext("{*}FrToDt/{*}ToDtTm")
+                if from_date:
+                    stmt_info.setdefault("from_date", from_date[:10])
+                if to_date:
+                    stmt_info["to_date"] = to_date[:10]
+                elem.clear()
+
+        return entries, stmt_info
+
+    @staticmethod
+    def _camt_entry_data(entry: Any) -> Dict[str, Any]:
+        """Flatten one CAMT.053 <Ntry> element into the fields we import"""
+        amount_elem = entry.find("{*}Amt")
+        is_credit = entry.findtext("{*}CdtDbtInd") == "CRDT"
+
+        # The counterparty is the debtor on money in, the creditor on money out
+        party = "Dbtr" if is_credit else "Cdtr"
+        details = entry.find("{*}NtryDtls/{*}TxDtls")
+
+        counterparty_name = None
+        counterparty_account = None
+        remittance = None
+        end_to_end_id = None
+
+        if details is not None:
+            counterparty_name = (
+                details.findtext(f"{{*}}RltdPties/{{*}}{party}/{{*}}Nm")
+                or details.findtext(f"{{*}}RltdPties/{{*}}{party}/{{*}}Pty/{{*}}Nm")
+            )
+            counterparty_account = details.findtext(
+                f"{{*}}RltdPties/{{*}}{party}Acct/{{*}}Id/{{*}}IBAN"
+            )
+            end_to_end_id = details.findtext("{*}Refs/{*}EndToEndId")
+
+            unstructured = [
+                text.strip()
+                for text in (e.text for e in details.findall("{*}RmtInf/{*}Ustrd"))
+                if text
+            ]
+            remittance = (
+                " ".join(unstructured)
+                or details.findtext("{*}RmtInf/{*}Strd/{*}CdtrRefInf/{*}Ref")
+            )
+
+        booking_date = entry.findtext("{*}BookgDt/{*}Dt") or entry.findtext("{*}BookgDt/{*}DtTm")
+        value_date = entry.findtext("{*}ValDt/{*}Dt") or entry.findtext("{*}ValDt/{*}DtTm")
+
+        return {
+            "credit_debit_indicator": "CRDT" if is_credit else "DBIT",
+            "amount": amount_elem.text if amount_elem is not None else 0,
+            "currency": amount_elem.get("Ccy", "EUR") if amount_elem is not None else "EUR",
+            "booking_date": booking_date[:10] if booking_date else None,
+            "value_date": value_date[:10] if value_date else None,
+            "entry_reference": entry.findtext("{*}AcctSvcrRef") or entry.findtext("{*}NtryRef"),
+            "end_to_end_id": end_to_end_id,
+            "remittance_information": remittance or entry.findtext("{*}AddtlNtryInf"),
+            "counterparty_name": counterparty_name,
+            "counterparty_account": counterparty_account,
+        }
+
     def _parse_mt940(
         self,
         file_content: bytes,
@@ -368,7 +368,11 @@ class BillingAutomationService:
             True if user can access features, False if suspended
         """
         subscription = self.billing_repo.get_subscription_by_user(user_id)
+        return self._subscription_allows_features(subscription)
 
+    @staticmethod
+    def _subscription_allows_features(subscription: Optional[Subscription]) -> bool:
+        """Whether a (possibly missing) subscription grants feature access"""
         if not subscription:
             return False  # No subscription = no access
 
@@ -398,7 +402,31 @@ class BillingAutomationService:
             Summary dict or None
         """
         subscription = self.billing_repo.get_subscription_by_user(user_id)
+        return self._build_status_summary(subscription)
 
+    def get_billing_overview(self, user_id: str) -> Dict[str, Any]:
+        """
+        Get status summary and feature access for user from a single
+        subscription lookup
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            Dict with status_summary (None without a subscription) and
+            can_access_features
+        """
+        subscription = self.billing_repo.get_subscription_by_user(user_id)
+
+        return {
+            "status_summary": self._build_status_summary(subscription),
+            "can_access_features": self._subscription_allows_features(subscription),
+        }
+
+    def _build_status_summary(
+        self, subscription: Optional[Subscription]
+    ) -> Optional[Dict[str, Any]]:
+        """Build the status summary dict for a subscription"""
         if not subscription:
             return None
 
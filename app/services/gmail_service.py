@@ -21,6 +21,9 @@ SCOPES = [
     'openid'
 ]
 
+# Gmail accepts up to 100 calls per batch request but recommends at most 50
+MESSAGE_BATCH_SIZE = 50
+
 class GmailService:
     def __init__(self, user_credentials: Dict = None):
         self.creds = None
@@ -65,22 +68,7 @@ class GmailService:
             next_page_token = result.get('nextPageToken')
             
             # Get detailed information for each message
-            detailed_messages = []
-            for message in messages:
-                try:
-                    msg_detail = self.service.users().messages().get(
-                        userId='me', 
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-                    
-                    parsed_email = self._parse_email(msg_detail)
-                    if parsed_email:
-                        detailed_messages.append(parsed_email)
-                        
-                except Exception as e:
-                    print(f"Error processing message {message['id']}: {e}")
-                    continue
+            detailed_messages = self._get_messages([message['id'] for message in messages])
             
             return {
                 'emails': detailed_messages,
@@ -92,6 +80,57 @@ class GmailService:
             print(f'An error occurred: {error}')
             raise Exception(f"Gmail API error: {error}")
     
+    def get_all_purchase_emails(self, max_emails: int = 500) -> List[Dict]:
+        """Fetch purchase emails across result pages, up to max_emails"""
+        if not self.service:
+            if not self.authenticate():
+                raise Exception("Failed to authenticate with Gmail")
+        
+        try:
+            message_ids = []
+            page_token = None
+            while len(message_ids) < max_emails:
+                result = self.service.users().messages().list(
+                    userId='me',
+                    q='category:purchases',
+                    maxResults=min(500, max_emails - len(message_ids)),
+                    pageToken=page_token
+                ).execute()
+                
+                message_ids.extend(message['id'] for message in result.get('messages', []))
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+            
+            return self._get_messages(message_ids)
+            
+        except HttpError as error:
+            print(f'An error occurred: {error}')
+            raise Exception(f"Gmail API error: {error}")
+    
+    def _get_messages(self, message_ids: List[str]) -> List[Dict]:
+        """Fetch and parse messages using batch requests, keeping the listed order"""
+        parsed_emails = {}
+        
+        def _on_message(request_id, response, exception):
+            if exception is not None:
+                print(f"Error processing message {request_id}: {exception}")
+                return
+            parsed_email = self._parse_email(response)
+            if parsed_email:
+                parsed_emails[request_id] = parsed_email
+        
+        for start in range(0, len(message_ids), MESSAGE_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=_on_message)
+            for message_id in message_ids[start:start + MESSAGE_BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(userId='me', id=message_id, format='full'),
+                    request_id=message_id
+                )
+            batch.execute()
+        
+        return [parsed_emails[message_id] for message_id in message_ids if message_id in parsed_emails]
+    
     def _parse_email(self, message: Dict) -> Optional[Dict]:
         """Parse email message and extract relevant information"""
         try:
@@ -371,21 +410,7 @@ class GmailService:
             
             messages = result.get('messages', [])
             
-            detailed_messages = []
-            for message in messages:
-                try:
-                    msg_detail = self.service.users().messages().get(
-                        userId='me', 
-                        id=message['id'],
-                        format='full'
-                    ).execute()
-                    
-                    parsed_email = self._parse_email(msg_detail)
-                    if parsed_email:
-                        detailed_messages.append(parsed_email)
-                        
-                except Exception as e:
-                    continue
+            detailed_messages = self._get_messages([message['id'] for message in messages])
             
             return {
                 'emails': detailed_messages,
@@ -9,6 +9,8 @@ from difflib import SequenceMatcher
 import logging
 import re
 
+from pymongo.errors import BulkWriteError
+
 from app.models.bank_transactions import (
     BankTransaction,
     PaymentInvoiceMatch,
@@ -16,7 +18,7 @@ from app.models.bank_transactions import (
     TransactionStatus,
     TransactionType,
 )
-from app.repos.bank_repo import BankRepository
+from app.repos.bank_repo import BULK_INSERT_BATCH_SIZE, BankRepository
 
 logger = logging.getLogger(__name__)
 
@@ -57,13 +59,17 @@ class PaymentMatchingService:
             organization_id
         )
 
+        # Score everything first, then write all matches in bulk
+        pending_matches: List[Tuple[BankTransaction, Dict[str, Any]]] = []
+
         for transaction in unmatched_transactions:
             stats["total_processed"] += 1
 
             # Attempt to match
-            match_result = self.match_transaction(transaction, organization_id)
+            match_result = self._find_best_match(transaction, organization_id)
 
             if match_result:
+                pending_matches.append((transaction, match_result))
                 match_score = match_result["score"]
 
                 if match_score >= self.EXACT_MATCH_THRESHOLD:
@@ -75,6 +81,9 @@ class PaymentMatchingService:
             else:
                 stats["unmatched"] += 1
 
+        # Raises on write failures; the stats above only hold once everything is stored
+        self._create_match_records_bulk(pending_matches)
+
         logger.info(f"Payment matching completed for org {organization_id}: {stats}")
         return stats
 
@@ -92,6 +101,17 @@ class PaymentMatchingService:
             Match result dict with invoice_id, voucher_id, score, and criteria
             None if no match found
         """
+        best_match = self._find_best_match(transaction, organization_id)
+
+        if best_match:
+            self._create_match_record(transaction, best_match)
+
+        return best_match
+
+    def _find_best_match(
+        self, transaction: BankTransaction, organization_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Score candidate invoices and return the best match at medium confidence or above"""
         # Get candidate invoices (unpaid or partially paid)
         candidate_invoices = self._get_candidate_invoices(
             organization_id, transaction
@@ -120,9 +140,7 @@ class PaymentMatchingService:
                     "invoice": invoice,
                 }
 
-        # If we have a good match, create the match record
         if best_match and best_score >= self.MEDIUM_CONFIDENCE_THRESHOLD:
-            self._create_match_record(transaction, best_match)
             return best_match
 
         return None
@@ -272,29 +290,8 @@ class PaymentMatchingService:
             match_result: Match result dict
         """
         try:
-            # Determine match status based on score
             score = match_result["score"]
-
-            if score >= self.EXACT_MATCH_THRESHOLD:
-                match_status = MatchStatus.AUTO_MATCHED
-            elif score >= self.HIGH_CONFIDENCE_THRESHOLD:
-                match_status = MatchStatus.AUTO_MATCHED
-            else:
-                match_status = MatchStatus.PARTIALLY_MATCHED
-
-            # Create match record
-            payment_match = PaymentInvoiceMatch(
-                organization_id=transaction.organization_id,
-                transaction_id=str(transaction.id),
-                invoice_id=match_result["invoice_id"],
-                voucher_id=match_result.get("voucher_id"),
-                match_status=match_status,
-                match_score=score,
-                match_method="automated",
-                matched_amount=transaction.amount,
-                criteria_matched=match_result["criteria"],
-                notes=f"Auto-matched with {score}% confidence",
-            )
+            payment_match = self._build_payment_match(transaction, match_result)
 
             match_id = self.bank_repo.create_payment_match(payment_match)
 
@@ -313,12 +310,83 @@ class PaymentMatchingService:
         except Exception as e:
             logger.error(f"Error creating match record: {e}")
 
+    def _build_payment_match(
+        self, transaction: BankTransaction, match_result: Dict
+    ) -> PaymentInvoiceMatch:
+        """Build the automated payment-invoice match record for a scored match"""
+        # Determine match status based on score
+        score = match_result["score"]
+
+        if score >= self.EXACT_MATCH_THRESHOLD:
+            match_status = MatchStatus.AUTO_MATCHED
+        elif score >= self.HIGH_CONFIDENCE_THRESHOLD:
+            match_status = MatchStatus.AUTO_MATCHED
+        else:
+            match_status = MatchStatus.PARTIALLY_MATCHED
+
+        return PaymentInvoiceMatch(
+            organization_id=transaction.organization_id,
+            transaction_id=str(transaction.id),
+            invoice_id=match_result["invoice_id"],
+            voucher_id=match_result.get("voucher_id"),
+            match_status=match_status,
+            match_score=score,
+            match_method="automated",
+            matched_amount=transaction.amount,
+            criteria_matched=match_result["criteria"],
+            notes=f"Auto-matched with {score}% confidence",
+        )
+
+    def _create_match_records_bulk(
+        self, pending_matches: List[Tuple[BankTransaction, Dict[str, Any]]]
+    ) -> None:
+        """
+        Create match records and update transactions for many matches at once
+
+        Each batch of up to 1000 matches goes in with one insert_many, then
+        one bulk_write updates the transactions whose match record was
+        written, so a failure never leaves a record without its transaction
+        update. Write errors propagate so callers don't report matches that
+        were never stored.
+        """
+        for start in range(0, len(pending_matches), BULK_INSERT_BATCH_SIZE):
+            batch = pending_matches[start:start + BULK_INSERT_BATCH_SIZE]
+            payment_matches = [
+                self._build_payment_match(transaction, match_result)
+                for transaction, match_result in batch
+            ]
+
+            write_error = None
+            try:
+                self.bank_repo.create_payment_matches_bulk(payment_matches)
+                written = batch
+            except BulkWriteError as e:
+                # Unordered insert: everything but the reported rows was stored
+                failed = {err["index"] for err in e.details.get("writeErrors", [])}
+                written = [item for index, item in enumerate(batch) if index not in failed]
+                write_error = e
+
+            self.bank_repo.match_transactions_to_invoices_bulk([
+                {
+                    "transaction_id": str(transaction.id),
+                    "invoice_id": match_result["invoice_id"],
+                    "voucher_id": match_result.get("voucher_id"),
+                }
+                for transaction, match_result in written
+            ])
+
+            logger.info(f"Created {len(written)} payment matches in bulk")
+
+            if write_error is not None:
+                raise write_error
+
     def manual_match(
         self,
         transaction_id: str,
         invoice_id: str,
         voucher_id: Optional[str],
         user_id: str,
+        organization_id: str,
         notes: Optional[str] = None,
     ) -> PaymentInvoiceMatch:
         """
@@ -329,13 +397,19 @@ class PaymentMatchingService:
             invoice_id: Invoice ID
             voucher_id: Voucher ID (optional)
             user_id: User who created the match
+            organization_id: Organization that must own the transaction
             notes: Optional notes
 
         Returns:
             PaymentInvoiceMatch object
         """
-        # Get transaction
-        transaction = self.bank_repo.get_transaction(transaction_id)
+        # Update transaction and read it back in a single round trip
+        transaction = self.bank_repo.manual_match_transaction(
+            transaction_id=transaction_id,
+            organization_id=organization_id,
+            invoice_id=invoice_id,
+            voucher_id=voucher_id,
+        )
 
         if not transaction:
             raise ValueError("Transaction not found")
@@ -358,23 +432,19 @@ class PaymentMatchingService:
         match_id = self.bank_repo.create_payment_match(payment_match)
         payment_match.id = match_id
 
-        # Update transaction
-        self.bank_repo.match_transaction_to_invoice(
-            transaction_id=transaction_id,
-            invoice_id=invoice_id,
-            voucher_id=voucher_id,
-        )
-
         logger.info(f"Manual match created by user {user_id} for transaction {transaction_id}")
 
         return payment_match
 
-    def unmatch_transaction(self, transaction_id: str) -> bool:
+    def unmatch_transaction(
+        self, transaction_id: str, organization_id: Optional[str] = None
+    ) -> bool:
         """
         Unmatch a transaction from its invoice
 
         Args:
             transaction_id: Transaction ID
+            organization_id: Restrict to a transaction owned by this organization
 
         Returns:
             Success boolean
@@ -385,6 +455,7 @@ class PaymentMatchingService:
                 transaction_id,
                 TransactionStatus.PENDING,
                 MatchStatus.UNMATCHED,
+                organization_id=organization_id,
             )
 
             logger.info(f"Unmatched transaction {transaction_id}")
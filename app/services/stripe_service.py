@@ -4,6 +4,7 @@ Handles all Stripe payment integration including subscriptions, payments, and we
 """
 
 import os
+import orjson
 import stripe
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
@@ -542,10 +543,16 @@ class StripeService:
             Verified event data
         """
         try:
-            event = stripe.Webhook.construct_event(
-                payload, sig_header, self.webhook_secret
+            # The signature covers the exact bytes Stripe sent, so verify them
+            # as-is and only then parse the body (with orjson rather than the
+            # stdlib json that stripe.Webhook.construct_event uses)
+            stripe.WebhookSignature.verify_header(
+                payload.decode("utf-8"),
+                sig_header,
+                self.webhook_secret,
+                stripe.Webhook.DEFAULT_TOLERANCE,
             )
-            return event
+            return orjson.loads(payload)
         except ValueError as e:
             logger.error(f"Invalid webhook payload: {e}")
             raise ValueError("Invalid payload")